@@ -32,6 +32,10 @@ class RtspCameraSource(CameraSource):
             raise RuntimeError(f"Failed to open RTSP stream: {rtsp_url}")
         self.is_running = True
 
+        # Stream position (PTS) of the anchor frame minus its host time, see _frame_timestamp_ms
+        self._pts_anchor_ms: Optional[float] = None
+        self._last_pos_ms = 0.0
+
         # Create a queue for caching image data
         # Limit queue size to 10 frames
         self.image_queue = queue.Queue(maxsize=10)
@@ -49,12 +53,13 @@ class RtspCameraSource(CameraSource):
                 time.sleep(0.1)  # Small delay if frame read fails
                 continue
 
-            timestamp_ms = int(time.time() * 1e3)  # milliseconds
+            timestamp_ms_local = int(time.time() * 1e3)  # milliseconds
+            timestamp_ms = self._frame_timestamp_ms(timestamp_ms_local)
             height, width, channels = frame.shape
 
             image_data = ImageData(
                 timestamp_ms=timestamp_ms,
-                timestamp_ms_local=timestamp_ms,
+                timestamp_ms_local=timestamp_ms_local,
                 image=frame,
                 width=width,
                 height=height,
@@ -72,6 +77,24 @@ class RtspCameraSource(CameraSource):
             # Small delay to control capture rate
             # time.sleep(0.033)  # ~30 FPS
 
+    def _frame_timestamp_ms(self, now_ms: int) -> int:
+        """
+        Camera-clock timestamp of the frame just read.
+
+        The stream position (CAP_PROP_POS_MSEC, from the PTS) is anchored to host time
+        at the first frame, so frame gaps follow the camera rather than read times;
+        the constant anchor error is absorbed by the Matcher's clock offset estimate.
+        Re-anchored when the position jumps back (stream restart). Backends that
+        report no position fall back to the host read time.
+        """
+        pos_ms = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+        if not pos_ms or pos_ms <= 0:
+            return now_ms
+        if self._pts_anchor_ms is None or pos_ms < self._last_pos_ms:
+            self._pts_anchor_ms = now_ms - pos_ms
+        self._last_pos_ms = pos_ms
+        return int(self._pts_anchor_ms + pos_ms)
+
     def get_image(self) -> Optional[ImageData]:
         """Get the latest image data from the queue"""
         latest_image = None
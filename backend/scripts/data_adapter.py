@@ -11,7 +11,7 @@ Features:
 """
 
 
-from typing import Optional, Tuple, Callable
+from typing import Optional, Tuple, Callable, List
 import threading
 from backend.utils.log_util import logger
 from backend.scripts.record_source import RecordSource
@@ -41,6 +41,7 @@ class DataAdapter:
         self.is_running = False
         self.image_callback: Optional[Callable[[ImageData], None]] = None
         self.event_callback: Optional[Callable[[FrameData], None]] = None
+        self.events_callback: Optional[Callable[[List[EventData]], None]] = None
         self.points_callback: Optional[Callable[[PointsData], None]] = None
         self.mode = None
 
@@ -52,6 +53,10 @@ class DataAdapter:
         """Set callback function for receiving event data"""
         self.event_callback = callback
 
+    def set_events_callback(self, callback: Callable[[List[EventData]], None]):
+        """Set callback function for receiving all events of one message at once, used instead of the event callback"""
+        self.events_callback = callback
+
     def set_points_callback(self, callback: Callable[[PointsData], None]):
         """Set callback function for receiving points data"""
         self.points_callback = callback
@@ -150,7 +155,9 @@ class DataAdapter:
                 # Call event callback if provided and data is available
                 if frame_data is not None:
                     event_data = frame_data.event_data
-                    if self.event_callback and event_data:
+                    if self.events_callback and event_data:
+                        self.events_callback(event_data)
+                    elif self.event_callback and event_data:
                         for i_e in event_data:
                             self.event_callback(i_e)
                     point_data = frame_data.pointcloud
@@ -180,6 +187,8 @@ class DataAdapter:
                 self.record_source.set_camera_call_back(self.image_callback)
             if self.event_callback:
                 self.record_source.set_event_call_back(self.event_callback)
+            if self.events_callback:
+                self.record_source.set_events_call_back(self.events_callback)
             if self.points_callback:
                 self.record_source.set_points_call_back(self.points_callback)
 
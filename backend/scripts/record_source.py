@@ -1,4 +1,4 @@
-from typing import Callable
+from typing import Callable, List
 import time
 import numpy as np
 from backend.utils.log_util import logger
@@ -29,6 +29,7 @@ class RecordSource:
         self.points_channel = points_channel
         self.event_type = event_type
         self.event_call_back = None
+        self.events_call_back = None
         self.is_running = False
         self.fps = fps
         # seconds per frame
@@ -63,6 +64,10 @@ class RecordSource:
     def set_event_call_back(self, event_call_back: Callable[[EventData], None]):
         self.event_call_back = event_call_back
 
+    def set_events_call_back(self, events_call_back: Callable[[List[EventData]], None]):
+        """Receive all events of one BaseEvents message at once, used instead of the event callback"""
+        self.events_call_back = events_call_back
+
     def set_points_call_back(self, points_call_back: Callable[[PointsData], None]):
         self.points_call_back = points_call_back
 
@@ -107,6 +112,13 @@ class RecordSource:
                 base_events = message
                 if "BaseEvents" not in msg_type:
                     continue
+                if self.events_call_back:
+                    events = [handle_base_event(base_event, self.event_type)
+                              for base_event in base_events.base_events]
+                    events = [event_data for event_data in events if event_data is not None]
+                    if events:
+                        self.events_call_back(events)
+                    continue
                 for base_event in base_events.base_events:
                     event_data = handle_base_event(base_event, self.event_type)
                     if event_data is None:
@@ -0,0 +1,59 @@
+from bisect import bisect_left
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+# 默认桶上界（毫秒），最后一个桶收集所有更大的值
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+
+class Histogram:
+    """
+    固定桶的直方图：
+    - observe(): 记录一个值，O(log 桶数)
+    - snapshot(): 计数、均值、最小/最大值，以及按桶上界估计的 p50/p90/p99
+    调用方负责加锁，snapshot() 在并发写入时读到的是近似值
+    """
+
+    def __init__(self, buckets: Optional[Sequence[float]] = None):
+        self.buckets = tuple(buckets or DEFAULT_BUCKETS_MS)
+        self.reset()
+
+    def reset(self) -> None:
+        """清空所有记录"""
+        self.counts = np.zeros(len(self.buckets) + 1, dtype=np.int64)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def observe(self, value: float) -> None:
+        """记录一个值"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> float:
+        """估计第 q 百分位数（所在桶的上界，不超过最大值）"""
+        if not self.count:
+            return 0.0
+        rank = int(np.searchsorted(np.cumsum(self.counts), q / 100.0 * self.count, side='left'))
+        return min(float(self.buckets[rank]), self.max) if rank < len(self.buckets) else self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出统计信息"""
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'mean': self.sum / self.count,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+        }
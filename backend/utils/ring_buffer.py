@@ -0,0 +1,125 @@
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+
+class TimestampRingBuffer:
+    """
+    按时间戳排序的有界缓冲区：时间戳存放在 NumPy 数组中，数据对象存放在平行的槽位列表中
+    - append(): 追加到队尾，满时淘汰最旧的元素，O(1)；时间戳乱序时插入到排序位置
+    - bisect_left()/bisect_right(): 在时间戳上二分查找，O(log n)
+    - pop_front()/pop_front_n(): 从队首弹出，O(1)
+    - pop_at(): 弹出任意位置的元素，需要移动其后的元素
+    底层数组长度为 2 * capacity，队尾写到数组末尾时把有效区间整体搬回数组开头（均摊 O(1)）
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, int(capacity))
+        self._timestamps = np.zeros(2 * self.capacity, dtype=np.float64)
+        self._items: List[Any] = [None] * (2 * self.capacity)
+        self._head = 0
+        self._tail = 0
+
+    def __len__(self) -> int:
+        return self._tail - self._head
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        """有效区间的时间戳（只读视图，升序）"""
+        view = self._timestamps[self._head:self._tail]
+        view.flags.writeable = False
+        return view
+
+    def _compact(self) -> None:
+        """把有效区间搬回数组开头，腾出队尾空间"""
+        n = len(self)
+        self._timestamps[:n] = self._timestamps[self._head:self._tail]
+        self._items[:n] = self._items[self._head:self._tail]
+        self._items[n:] = [None] * (len(self._items) - n)
+        self._head, self._tail = 0, n
+
+    def append(self, timestamp: float, item: Any) -> Optional[Tuple[float, Any]]:
+        """
+        追加元素
+
+        返回:
+            因容量已满被淘汰的最旧元素 (timestamp, item)，没有淘汰时返回 None
+        """
+        evicted = self.pop_front() if len(self) >= self.capacity else None
+        if self._tail == len(self._items):
+            self._compact()
+
+        if len(self) and timestamp < self._timestamps[self._tail - 1]:
+            # 乱序到达：插入到排序位置，相同时间戳保持到达顺序
+            pos = self._head + self.bisect_right(timestamp)
+            self._timestamps[pos + 1:self._tail + 1] = self._timestamps[pos:self._tail]
+            self._items[pos + 1:self._tail + 1] = self._items[pos:self._tail]
+        else:
+            pos = self._tail
+        self._timestamps[pos] = timestamp
+        self._items[pos] = item
+        self._tail += 1
+        return evicted
+
+    def bisect_left(self, timestamp: float) -> int:
+        """时间戳小于 timestamp 的元素个数"""
+        return int(np.searchsorted(self._timestamps[self._head:self._tail], timestamp, side='left'))
+
+    def bisect_right(self, timestamp: float) -> int:
+        """时间戳小于等于 timestamp 的元素个数"""
+        return int(np.searchsorted(self._timestamps[self._head:self._tail], timestamp, side='right'))
+
+    def peek(self, index: int = 0) -> Tuple[float, Any]:
+        """查看第 index 个元素 (timestamp, item)，不弹出"""
+        if not 0 <= index < len(self):
+            raise IndexError("ring buffer index out of range")
+        pos = self._head + index
+        return float(self._timestamps[pos]), self._items[pos]
+
+    def pop_front(self) -> Tuple[float, Any]:
+        """弹出最旧的元素 (timestamp, item)"""
+        if not len(self):
+            raise IndexError("pop from empty ring buffer")
+        pos = self._head
+        entry = (float(self._timestamps[pos]), self._items[pos])
+        self._items[pos] = None
+        self._head += 1
+        if self._head == self._tail:
+            self._head = self._tail = 0
+        return entry
+
+    def pop_front_n(self, count: int) -> List[Tuple[float, Any]]:
+        """弹出最旧的 count 个元素"""
+        count = min(max(0, count), len(self))
+        end = self._head + count
+        entries = list(zip(self._timestamps[self._head:end].tolist(), self._items[self._head:end]))
+        self._items[self._head:end] = [None] * count
+        self._head = end
+        if self._head == self._tail:
+            self._head = self._tail = 0
+        return entries
+
+    def pop_at(self, index: int) -> Tuple[float, Any]:
+        """弹出第 index 个元素，较靠前时移动前半段，否则移动后半段"""
+        if not 0 <= index < len(self):
+            raise IndexError("ring buffer index out of range")
+        if index == 0:
+            return self.pop_front()
+        pos = self._head + index
+        entry = (float(self._timestamps[pos]), self._items[pos])
+        if index < len(self) // 2:
+            self._timestamps[self._head + 1:pos + 1] = self._timestamps[self._head:pos]
+            self._items[self._head + 1:pos + 1] = self._items[self._head:pos]
+            self._items[self._head] = None
+            self._head += 1
+        else:
+            self._timestamps[pos:self._tail - 1] = self._timestamps[pos + 1:self._tail]
+            self._items[pos:self._tail - 1] = self._items[pos + 1:self._tail]
+            self._tail -= 1
+            self._items[self._tail] = None
+        return entry
+
+    def clear(self) -> None:
+        """清空所有元素"""
+        self._items = [None] * len(self._items)
+        self._head = self._tail = 0
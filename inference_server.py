@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+InferenceServer class for sharing one detection model across several camera streams.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import yaml
+from ultralytics import YOLO
+from ultralytics.trackers.bot_sort import BOTSORT
+from ultralytics.trackers.byte_tracker import BYTETracker
+from ultralytics.utils import IterableSimpleNamespace
+
+from iou_tracker import IouTracker
+from tracker import TRACKER_CONFIGS, Tracker, resolve_class_ids
+
+logger = logging.getLogger(__name__)
+
+TRACKER_MAP = {'bytetrack': BYTETracker, 'botsort': BOTSORT}
+
+
+class StreamTracker(Tracker):
+    """
+    Tracker client bound to one stream of an InferenceServer.
+
+    It keeps the Tracker interface (cadence, propagation, drawing) but sends
+    full detections to the shared server instead of running its own model.
+    """
+
+    def __init__(self, server: 'InferenceServer', stream_id: str, detect_interval: int = 1,
+                 tracker_type: str = 'botsort'):
+        """
+        Initialize the StreamTracker.
+
+        Args:
+            server (InferenceServer): Server owning the model and the per-stream tracker state.
+            stream_id (str): Identifier of the camera stream.
+            detect_interval (int): Run full detection every N frames.
+            tracker_type (str): Tracker kept for this stream on the server.
+        """
+        super().__init__(onnx_model_path=server.onnx_model_path,
+                         detect_interval=detect_interval,
+                         class_names=server.class_names,
+                         confidence_threshold=server.confidence_threshold,
+                         nms_threshold=server.nms_threshold,
+                         model=server.model)
+        self.server = server
+        self.stream_id = stream_id
+        self.tracker_type = tracker_type
+
+    def _run_tracker(self, image: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        Submit the frame to the server and wait for this stream's tracking results.
+
+        If the server doesn't answer within its result timeout, the request is cancelled
+        and the boxes of the last detection are propagated with their velocity instead.
+        """
+        future = self.server.submit(self.stream_id, image)
+        try:
+            return future.result(timeout=self.server.result_timeout_ms / 1000.0)
+        except FutureTimeoutError:
+            future.cancel()
+            self.server.timeouts += 1
+            logger.warning(f"Inference for stream {self.stream_id} timed out after "
+                           f"{self.server.result_timeout_ms} ms, propagating the last tracks")
+            return self.predict_tracks(self._frames_since_detect + 1)
+
+
+class InferenceServer:
+    """
+    A class that batches frames from several camera streams into one model call.
+
+    A worker thread collects pending frames until `max_batch_size` frames are queued
+    or `max_wait_ms` has passed since the first one, runs batched detection, then
+    updates a separate tracker per stream and resolves each stream's Future.
+    """
+
+    def __init__(self,
+                 onnx_model_path: str,
+                 max_batch_size: int = 4,
+                 max_wait_ms: float = 10.0,
+                 class_names: Optional[List[str]] = None,
+                 confidence_threshold: float = 0.5,
+                 nms_threshold: float = 0.7,
+                 tracker_type: str = 'botsort',
+                 frame_rate: int = 30,
+                 result_timeout_ms: float = 1000.0):
+        """
+        Initialize the InferenceServer and start its worker thread.
+
+        Args:
+            onnx_model_path (str): Path to the model file, loaded once for all streams.
+            max_batch_size (int): Maximum number of frames per model call.
+            max_wait_ms (float): Maximum time to wait for a batch to fill after its first frame.
+            class_names (Optional[List[str]]): Class whitelist passed to the model, None keeps every class.
+            confidence_threshold (float): Minimum confidence threshold for detections.
+            nms_threshold (float): Threshold for Non-Maximum Suppression.
+            tracker_type (str): Default tracker for new streams: "botsort", "bytetrack" or "iou".
+            frame_rate (int): Stream frame rate used to size the tracker buffers.
+            result_timeout_ms (float): How long a StreamTracker waits for its results before
+                falling back to propagated tracks.
+        """
+        self.onnx_model_path = onnx_model_path
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max_wait_ms
+        self.class_names = list(class_names) if class_names else None
+        self.confidence_threshold = confidence_threshold
+        self.nms_threshold = nms_threshold
+        self.frame_rate = frame_rate
+        self.result_timeout_ms = result_timeout_ms
+
+        self.model = YOLO(onnx_model_path, task='detect')
+        self.classes = self.model.names
+        self.class_ids = resolve_class_ids(self.classes, self.class_names)
+
+        if tracker_type not in TRACKER_CONFIGS:
+            raise ValueError(f"tracker_type must be one of {list(TRACKER_CONFIGS)}, got: {tracker_type}")
+        self.tracker_type = tracker_type
+        self.tracker_args: Dict[str, IterableSimpleNamespace] = {}
+
+        # Tracker state per stream, key: stream_id
+        self.stream_trackers: Dict[str, Any] = {}
+        self.streams_lock = threading.Lock()
+
+        self.requests: queue.Queue = queue.Queue()
+        self.batches = 0
+        self.frames = 0
+        self.timeouts = 0
+
+        self.is_running = True
+        self.worker_thread = threading.Thread(target=self._worker)
+        self.worker_thread.daemon = True
+        self.worker_thread.start()
+
+    def _create_stream_tracker(self, tracker_type: str) -> Any:
+        """Create the tracker state for one stream; Ultralytics configs are loaded once per type."""
+        if tracker_type == 'iou':
+            return IouTracker()
+        if tracker_type not in self.tracker_args:
+            with open(TRACKER_CONFIGS[tracker_type], 'r', encoding='utf-8') as f:
+                self.tracker_args[tracker_type] = IterableSimpleNamespace(**yaml.safe_load(f))
+        return TRACKER_MAP[tracker_type](args=self.tracker_args[tracker_type], frame_rate=self.frame_rate)
+
+    def register_stream(self, stream_id: str, detect_interval: int = 1,
+                        tracker_type: Optional[str] = None) -> StreamTracker:
+        """
+        Register a camera stream and return its tracker client.
+
+        Re-registering a stream resets its tracker state.
+
+        Args:
+            stream_id (str): Identifier of the camera stream.
+            detect_interval (int): Run full detection every N frames.
+            tracker_type (Optional[str]): Tracker for this stream, None uses the server default.
+
+        Returns:
+            StreamTracker: Tracker client that submits frames to this server.
+        """
+        tracker_type = tracker_type or self.tracker_type
+        if tracker_type not in TRACKER_CONFIGS:
+            raise ValueError(f"tracker_type must be one of {list(TRACKER_CONFIGS)}, got: {tracker_type}")
+        with self.streams_lock:
+            self.stream_trackers[stream_id] = self._create_stream_tracker(tracker_type)
+        logger.info(f"Registered stream {stream_id} with tracker {tracker_type}")
+        return StreamTracker(self, stream_id, detect_interval=detect_interval, tracker_type=tracker_type)
+
+    def unregister_stream(self, stream_id: str) -> None:
+        """
+        Drop the tracker state of a stream.
+
+        Args:
+            stream_id (str): Identifier of the camera stream.
+        """
+        with self.streams_lock:
+            self.stream_trackers.pop(stream_id, None)
+
+    def submit(self, stream_id: str, image: np.ndarray) -> Future:
+        """
+        Queue a frame for batched detection and tracking.
+
+        Args:
+            stream_id (str): Identifier of a registered camera stream.
+            image (np.ndarray): Input image in BGR format.
+
+        Returns:
+            Future: Resolves to the stream's tracking results for this frame.
+        """
+        future = Future()
+        if not self.is_running:
+            future.set_exception(RuntimeError("InferenceServer is stopped"))
+            return future
+        self.requests.put((stream_id, image, future))
+        return future
+
+    def _collect_batch(self) -> List[tuple]:
+        """Block for the first request, then gather more until the batch is full or the wait expires."""
+        try:
+            batch = [self.requests.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        """
+        Worker thread running batched inference.
+        """
+        logger.info("Inference worker thread started")
+        while self.is_running:
+            # Requests cancelled after a client timeout are skipped
+            batch = [request for request in self._collect_batch() if request[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                logger.error(f"Error in batched inference: {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+        logger.info("Inference worker thread stopped")
+
+    def _run_batch(self, batch: List[tuple]) -> None:
+        """Run one model call for the batch and update each stream's tracker in submission order."""
+        images = [image for _, image, _ in batch]
+        results = self.model.predict(images, verbose=False, classes=self.class_ids,
+                                     conf=self.confidence_threshold, iou=self.nms_threshold)
+        self.batches += 1
+        self.frames += len(batch)
+
+        for (stream_id, _, future), result in zip(batch, results):
+            with self.streams_lock:
+                stream_tracker = self.stream_trackers.get(stream_id)
+            if stream_tracker is None:
+                future.set_exception(KeyError(f"Stream {stream_id} is not registered"))
+                continue
+
+            det = result.boxes.cpu().numpy()
+            if isinstance(stream_tracker, IouTracker):
+                tracks = stream_tracker.update(det.xyxy, det.cls, det.conf)
+            elif len(det):
+                tracks = stream_tracker.update(det, result.orig_img)
+            else:
+                tracks = np.empty((0, 8))
+
+            tracking_results = []
+            for track in tracks:
+                cls_id = int(track[6])
+                tracking_results.append({
+                    'track_id': int(track[4]),
+                    'class_id': cls_id,
+                    'class_name': self.classes[cls_id],
+                    'box': track[:4].tolist()
+                })
+            future.set_result(tracking_results)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get batching statistics.
+
+        Returns:
+            Dict[str, Any]: Stream count, batch count, frame count, mean batch size, queue depth
+                and client timeouts.
+        """
+        batches = self.batches
+        frames = self.frames
+        return {
+            'streams': len(self.stream_trackers),
+            'batches': batches,
+            'frames': frames,
+            'mean_batch_size': frames / batches if batches else 0.0,
+            'queue_depth': self.requests.qsize(),
+            'timeouts': self.timeouts
+        }
+
+    def stop(self) -> None:
+        """
+        Stop the worker thread and fail pending requests.
+        """
+        self.is_running = False
+        if self.worker_thread.is_alive():
+            self.worker_thread.join(timeout=5.0)
+        while True:
+            try:
+                _, _, future = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError("InferenceServer is stopped"))
+        logger.info("InferenceServer stopped")
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+IouTracker class: a lightweight NumPy IoU/centroid tracker for fixed cameras.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+
+def iou_matrix(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """
+    Compute the pairwise IoU between two sets of boxes.
+
+    Args:
+        boxes_a (np.ndarray): (N, 4) boxes as x1, y1, x2, y2.
+        boxes_b (np.ndarray): (M, 4) boxes as x1, y1, x2, y2.
+
+    Returns:
+        np.ndarray: (N, M) IoU matrix.
+    """
+    x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+    y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+    x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+    y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(union, 1e-9)
+
+
+class IouTracker:
+    """
+    A vectorized IoU tracker with a centroid fallback.
+
+    Tracks are predicted with a constant velocity, then matched greedily to the
+    detections by IoU. Pairs without overlap can still match when their centroids
+    are closer than `centroid_gate` times the track's box diagonal, which keeps IDs
+    on fast vehicles at low frame rates. No appearance features and no camera
+    motion compensation are used, so it only suits fixed cameras.
+    """
+
+    def __init__(self,
+                 iou_threshold: float = 0.3,
+                 centroid_gate: float = 0.5,
+                 max_age: int = 10,
+                 velocity_smoothing: float = 0.5):
+        """
+        Initialize the IouTracker.
+
+        Args:
+            iou_threshold (float): Minimum IoU for a track/detection match.
+            centroid_gate (float): Centroid distance gate for non-overlapping matches, relative to the track diagonal.
+            max_age (int): Number of frames a track survives without a matching detection.
+            velocity_smoothing (float): Weight of the previous velocity when a match updates it.
+        """
+        self.iou_threshold = iou_threshold
+        self.centroid_gate = centroid_gate
+        self.max_age = max_age
+        self.velocity_smoothing = velocity_smoothing
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Drop every track and restart the ID counter.
+        """
+        self.boxes = np.empty((0, 4), dtype=np.float64)
+        self.velocities = np.empty((0, 4), dtype=np.float64)
+        self.track_ids = np.empty(0, dtype=np.int64)
+        self.class_ids = np.empty(0, dtype=np.int64)
+        self.ages = np.empty(0, dtype=np.int64)
+        self.next_id = 1
+
+    def _match(self, predicted: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+        """Greedy matching on a score matrix; returns (K, 2) track/detection index pairs."""
+        if len(predicted) == 0 or len(boxes) == 0:
+            return np.empty((0, 2), dtype=np.int64)
+
+        scores = iou_matrix(predicted, boxes)
+        valid = scores >= self.iou_threshold
+
+        # Centroid fallback, scored below any IoU match
+        track_centers = (predicted[:, :2] + predicted[:, 2:]) / 2
+        det_centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+        dist = np.linalg.norm(track_centers[:, None, :] - det_centers[None, :, :], axis=2)
+        diag = np.linalg.norm(predicted[:, 2:] - predicted[:, :2], axis=1)
+        gate = self.centroid_gate * np.maximum(diag, 1.0)
+        close = (~valid) & (dist <= gate[:, None])
+        scores = np.where(close, -dist / gate[:, None], scores)
+        valid |= close
+
+        rows, cols = np.nonzero(valid)
+        order = np.argsort(-scores[rows, cols], kind='stable')
+        used_rows = np.zeros(len(predicted), dtype=bool)
+        used_cols = np.zeros(len(boxes), dtype=bool)
+        matches = []
+        for r, c in zip(rows[order], cols[order]):
+            if used_rows[r] or used_cols[c]:
+                continue
+            used_rows[r] = True
+            used_cols[c] = True
+            matches.append((r, c))
+        return np.array(matches, dtype=np.int64).reshape(-1, 2)
+
+    def update(self,
+               boxes: np.ndarray,
+               class_ids: np.ndarray,
+               scores: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Update the tracks with the detections of one frame.
+
+        Args:
+            boxes (np.ndarray): (N, 4) detections as x1, y1, x2, y2.
+            class_ids (np.ndarray): (N,) class id per detection.
+            scores (Optional[np.ndarray]): (N,) confidence per detection.
+
+        Returns:
+            np.ndarray: (K, 8) tracks matched or created this frame, laid out like the
+                Ultralytics trackers: x1, y1, x2, y2, track_id, score, class_id, detection index.
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        class_ids = np.asarray(class_ids, dtype=np.int64).reshape(-1)
+        scores = np.ones(len(boxes)) if scores is None else np.asarray(scores, dtype=np.float64).reshape(-1)
+
+        predicted = self.boxes + self.velocities
+        matches = self._match(predicted, boxes)
+        track_idx, det_idx = matches[:, 0], matches[:, 1]
+
+        # Matched tracks: refresh box, velocity and class
+        measured = boxes[det_idx] - self.boxes[track_idx]
+        self.velocities[track_idx] = self.velocity_smoothing * self.velocities[track_idx] + \
+            (1.0 - self.velocity_smoothing) * measured
+        self.boxes[track_idx] = boxes[det_idx]
+        self.class_ids[track_idx] = class_ids[det_idx]
+        self.ages += 1
+        self.ages[track_idx] = 0
+
+        # Unmatched tracks coast on their velocity until they expire
+        unmatched_tracks = np.ones(len(self.boxes), dtype=bool)
+        unmatched_tracks[track_idx] = False
+        self.boxes[unmatched_tracks] = predicted[unmatched_tracks]
+        keep = self.ages <= self.max_age
+        matched_ids = self.track_ids[track_idx]
+
+        # Unmatched detections start new tracks
+        new_det = np.ones(len(boxes), dtype=bool)
+        new_det[det_idx] = False
+        new_det_idx = np.nonzero(new_det)[0]
+        new_ids = np.arange(self.next_id, self.next_id + len(new_det_idx), dtype=np.int64)
+        self.next_id += len(new_det_idx)
+
+        self.boxes = np.vstack([self.boxes[keep], boxes[new_det_idx]])
+        self.velocities = np.vstack([self.velocities[keep], np.zeros((len(new_det_idx), 4))])
+        self.track_ids = np.concatenate([self.track_ids[keep], new_ids])
+        self.class_ids = np.concatenate([self.class_ids[keep], class_ids[new_det_idx]])
+        self.ages = np.concatenate([self.ages[keep], np.zeros(len(new_det_idx), dtype=np.int64)])
+
+        out_det = np.concatenate([det_idx, new_det_idx])
+        out_ids = np.concatenate([matched_ids, new_ids])
+        return np.column_stack([
+            boxes[out_det], out_ids, scores[out_det], class_ids[out_det], out_det
+        ]).astype(np.float64)
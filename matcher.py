@@ -4,11 +4,19 @@
 Matcher class for managing maps of EventData and ImageData.
 """
 
+import heapq
+import itertools
 import threading
-from typing import Optional, Dict, List
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Optional, Dict, List
 from backend.modules.camera_modules import ImageData
 from backend.modules.simpl_modules import EventData
+from backend.utils.ring_buffer import TimestampRingBuffer
+from backend.utils.metrics import Histogram
 import logging
+import numpy as np
 
 # Set up logging
 logging.basicConfig(level=logging.INFO,
@@ -20,10 +28,58 @@ class Matcher:
     """
     A class that maintains two maps for EventData and ImageData,
     and provides interfaces for inputting data into these maps.
-    Uses region_name as the key and thread locks for thread safety.
+    Uses region_name as the key and one lock per region for thread safety,
+    so callbacks for different lanes don't contend.
+
+    Match modes:
+        first: an item matches the oldest queued counterpart inside the window.
+        nearest: items are held for up to `lookahead_ms`, then paired greedily by
+                 the smallest time difference, so neighbouring vehicles at busy
+                 lanes don't take each other's images. On the local clock images
+                 arrive later than their events by the decode and inference delay;
+                 that image latency is estimated like the sensor clock offset below
+                 (mode of the local arrival differences) and subtracted from the
+                 image timestamps. Until it is estimated, or when traffic is too
+                 regular to estimate it (evenly spaced vehicles), nearest pairing
+                 on the local clock picks the previous vehicle's counterpart once
+                 the latency exceeds half the gap between vehicles; use "first"
+                 or the sensor clock there.
+
+    Clocks:
+        use_local_timestamp=True matches on `timestamp_ms_local` (arrival time,
+        including queueing, decode and inference delays). With False, it matches
+        on the sensor timestamps (`timestamp_ms` of the event and of the camera
+        frame). The image-minus-event clock offset is the mode of a histogram of
+        the sensor timestamp differences of all event/image pairs of a region
+        that arrived within `max_time_diff_ms` of each other, independent of what
+        the matcher pairs: true pairs pile up at the offset while neighbouring
+        vehicles spread over the window. Until the peak holds `min_offset_samples`
+        differences and stands out from the rest of the histogram, the local
+        timestamps and `max_time_diff_ms` are used, afterwards the window shrinks
+        to `sensor_time_diff_ms`. Sensor clock matching falls back to the local
+        clock (and the histogram starts over) when its match rate drops below
+        `fallback_match_ratio` of the local clock's or the median residual of
+        its matches exceeds half the window, e.g. after a camera clock jump.
+        One stream may reach the matcher later than the other (e.g. images after
+        decode and inference). Regions on the sensor clock therefore expire and
+        settle items only once the region clock is `pipeline_delay_ms` past them,
+        the 99th percentile of the arrival delay difference of the pairs in the
+        histogram peak.
     """
 
-    def __init__(self, max_time_diff_ms: int = 5000, use_local_timestamp: bool = True, max_queue_size: int = 1000):
+    # Peak of the offset histogram: at least this many times the support of any other peak
+    OFFSET_PEAK_RATIO = 2.0
+    # New differences between two offset estimates
+    OFFSET_UPDATE_INTERVAL = 16
+    # Recent items whose outcomes are compared between the clocks
+    CLOCK_CHECK_ITEMS = 100
+
+    MATCH_MODES = ("first", "nearest")
+
+    def __init__(self, max_time_diff_ms: int = 5000, use_local_timestamp: bool = True, max_queue_size: int = 1000,
+                 match_mode: str = "first", lookahead_ms: float = 500, sweep_interval_ms: float = 1000,
+                 sensor_time_diff_ms: float = 300, min_offset_samples: int = 20, offset_window: int = 2000,
+                 offset_bin_ms: float = 20, fallback_match_ratio: float = 0.5):
         """
         Initialize the Matcher with empty maps.
 
@@ -31,21 +87,495 @@ class Matcher:
             max_time_diff_ms (int): Maximum time difference allowed between matching data.
             use_local_timestamp (bool): Whether to use local timestamp for matching.
             max_queue_size (int): Maximum number of items per region_name in both maps. Defaults to 1000.
+            match_mode (str): "first" or "nearest". Defaults to "first". On the local clock, "nearest"
+                relies on the estimated image latency; see the class docstring for its limitation.
+            lookahead_ms (float): In "nearest" mode, how long a pair may wait for a closer counterpart.
+            sweep_interval_ms (float): Longest sleep of the expiry sweeper thread, which otherwise
+                wakes at the earliest scheduled expiry; 0 disables it.
+            sensor_time_diff_ms (float): Matching window once the sensor clock offset is known.
+            min_offset_samples (int): Differences needed in the offset histogram peak before switching
+                to the sensor clocks; also the sensor clock matches needed before checking them.
+            offset_window (int): Number of recent event/image timestamp differences in the offset histogram.
+            offset_bin_ms (float): Bin width of the offset histogram.
+            fallback_match_ratio (float): Fall back to the local clock when the sensor clock match rate
+                drops below this fraction of the local clock match rate.
         """
+        if match_mode not in self.MATCH_MODES:
+            raise ValueError(f"match_mode must be one of {list(self.MATCH_MODES)}, got: {match_mode}")
         self.max_queue_size = max_queue_size
         self.max_time_diff_ms = max_time_diff_ms
         self.use_local_timestamp = use_local_timestamp
+        self.sensor_time_diff_ms = sensor_time_diff_ms
+        self.min_offset_samples = min_offset_samples
+
+        # Sensor clock offset (image timestamp_ms - event timestamp_ms), None until estimated;
+        # estimated from (sensor difference, local difference) of recent event/image pairs
+        self.offset_bin_ms = offset_bin_ms
+        self.fallback_match_ratio = fallback_match_ratio
+        self.clock_offset_ms: Optional[float] = None
+        self._offset_usable = False
+        self._offset_diffs: deque = deque(maxlen=offset_window)
+        self._offset_new = 0
+        self._offset_lock = threading.Lock()
 
-        # Map for storing EventData, key: region_name, value: list of EventData
-        self.event_map: Dict[str, List[EventData]] = {}
+        # Arrival delay difference between the streams, on top of the sensor clock offset
+        self.pipeline_delay_ms = 0.0
 
-        # Map for storing ImageData, key: region_name, value: list of ImageData
-        self.image_map: Dict[str, List[ImageData]] = {}
+        # Matched (1) or dropped (0) per item on each clock, and the residuals of the
+        # sensor clock matches, to detect a wrong offset
+        self._clock_outcomes: Dict[str, deque] = {
+            "local": deque(maxlen=self.CLOCK_CHECK_ITEMS), "sensor": deque(maxlen=self.CLOCK_CHECK_ITEMS)}
+        self._sensor_residuals: deque = deque(maxlen=self.CLOCK_CHECK_ITEMS)
+        self.clock_fallbacks = 0
 
-        # Thread locks for thread safety
-        # self.event_map_lock = threading.Lock()
-        # self.image_map_lock = threading.Lock()
+        # Nearest mode: image-minus-event arrival latency subtracted from image timestamps on the local clock
+        self.image_latency_ms = 0.0
+        self.match_mode = match_mode
+        self.lookahead_ms = lookahead_ms
+
+        # Map for storing EventData, key: region_name, value: EventData buffer sorted by timestamp
+        self.event_map: Dict[str, TimestampRingBuffer] = {}
+
+        # Map for storing ImageData, key: region_name, value: ImageData buffer sorted by timestamp
+        self.image_map: Dict[str, TimestampRingBuffer] = {}
+
+        # Thread locks for thread safety: map_lock only guards the region registry,
+        # each region's buffers are guarded by that region's lock
         self.map_lock = threading.Lock()
+        self.region_locks: Dict[str, threading.Lock] = {}
+
+        # Lock statistics per region, updated while holding the region lock
+        self.lock_acquisitions: Dict[str, int] = {}
+        self.lock_contentions: Dict[str, int] = {}
+
+        # Latest timestamp seen per region and the monotonic time (ms) it was seen;
+        # between arrivals a region's clock is assumed to advance with the wall clock
+        self.region_now: Dict[str, float] = {}
+        self.region_seen_at: Dict[str, float] = {}
+
+        # Clock the region's buffers are keyed on: "local" or "sensor"
+        self.region_clock: Dict[str, str] = {}
+
+        # Recent (local, sensor) timestamps per region and kind, within max_time_diff_ms of the latest arrival
+        self.region_recent: Dict[str, Dict[str, deque]] = {}
+
+        # In nearest mode, the region-clock time at which the first reserved pair becomes final, None if none
+        self.region_pair_due: Dict[str, Optional[float]] = {}
+
+        # Counters and match latency per region, updated while holding the region lock
+        self.region_counters: Dict[str, Dict[str, int]] = {}
+        self.match_latency: Dict[str, Histogram] = {}
+
+        # Expiry schedule: min-heap of (due monotonic ms, seq, region_name) keyed on the
+        # expiry of each region's oldest item; superseded entries are skipped when popped
+        self.sweep_interval_ms = sweep_interval_ms
+        self.result_sink: Optional[Callable[[List[Dict]], None]] = None
+        self._expiry_heap: List[tuple] = []
+        self._expiry_due: Dict[str, float] = {}
+        self._expiry_seq = itertools.count()
+        self._expiry_lock = threading.Lock()
+        self._sweeper_stop = threading.Event()
+        self._sweeper_wake = threading.Event()
+        self._sweeper_thread = None
+        if sweep_interval_ms > 0:
+            self._sweeper_thread = threading.Thread(target=self._sweeper)
+            self._sweeper_thread.daemon = True
+            self._sweeper_thread.start()
+
+    def _get_region_lock(self, region_name: str) -> threading.Lock:
+        """Get the lock of a region, registering the region and its buffers on first use."""
+        lock = self.region_locks.get(region_name)
+        if lock is None:
+            with self.map_lock:
+                lock = self.region_locks.get(region_name)
+                if lock is None:
+                    self.event_map[region_name] = TimestampRingBuffer(self.max_queue_size)
+                    self.image_map[region_name] = TimestampRingBuffer(self.max_queue_size)
+                    self.lock_acquisitions[region_name] = 0
+                    self.lock_contentions[region_name] = 0
+                    self.region_now[region_name] = float('-inf')
+                    self.region_seen_at[region_name] = self._monotonic_ms()
+                    self.region_clock[region_name] = "local"
+                    self.region_recent[region_name] = {
+                        kind: deque(maxlen=self.max_queue_size) for kind in ("event", "image")}
+                    self.region_pair_due[region_name] = None
+                for recent in self.region_recent[region_name].values():
+                    recent.clear()
+                    self.region_counters[region_name] = dict.fromkeys(
+                        ('matched', 'dropped_events', 'dropped_images', 'evicted_events', 'evicted_images'), 0)
+                    self.match_latency[region_name] = Histogram()
+                    lock = threading.Lock()
+                    self.region_locks[region_name] = lock
+        return lock
+
+    @contextmanager
+    def _region_lock(self, region_name: str):
+        """Hold the lock of a region, counting acquisitions that had to wait."""
+        lock = self._get_region_lock(region_name)
+        contended = not lock.acquire(blocking=False)
+        if contended:
+            lock.acquire()
+        try:
+            self.lock_acquisitions[region_name] += 1
+            if contended:
+                self.lock_contentions[region_name] += 1
+            yield
+        finally:
+            lock.release()
+
+    def get_lock_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Get the lock statistics per region.
+
+        Returns:
+            Dict[str, Dict[str, int]]: Acquisitions and contended acquisitions, key: region_name.
+        """
+        with self.map_lock:
+            regions = list(self.region_locks)
+        return {
+            region_name: {
+                'acquisitions': self.lock_acquisitions[region_name],
+                'contentions': self.lock_contentions[region_name]
+            } for region_name in regions
+        }
+
+    @property
+    def sensor_clock_ready(self) -> bool:
+        """Whether matching runs on the sensor clocks."""
+        return not self.use_local_timestamp and self.clock_offset_ms is not None and self._offset_usable
+
+    def _window_ms(self, region_name: str) -> float:
+        """Matching window of a region, narrower once its buffers are keyed on the sensor clock."""
+        return self.sensor_time_diff_ms if self.region_clock[region_name] == "sensor" else self.max_time_diff_ms
+
+    def _grace_ms(self, region_name: str) -> float:
+        """How long items wait for a counterpart of the later-arriving stream beyond the window."""
+        if self.region_clock[region_name] == "sensor":
+            return self.pipeline_delay_ms
+        # Images keyed back by their latency arrive that much behind the region clock
+        return abs(self.image_latency_ms)
+
+    @property
+    def _collects_differences(self) -> bool:
+        """Whether event/image timestamp differences are collected for the clock estimates."""
+        return not self.use_local_timestamp or self.match_mode == "nearest"
+
+    def _timestamp(self, data, clock: str = "local") -> float:
+        """
+        Timestamp used for matching; on the sensor clock, events are shifted onto the camera clock,
+        on the local clock images are shifted back by the estimated image latency (nearest mode).
+        """
+        if clock == "local":
+            if isinstance(data, EventData):
+                return data.timestamp_ms_local
+            return data.timestamp_ms_local - self.image_latency_ms
+        if isinstance(data, EventData):
+            return data.timestamp_ms + self.clock_offset_ms
+        return data.timestamp_ms
+
+    def _collect_differences(self, region_name: str, data, kind: str) -> List[tuple]:
+        """
+        Remember an item's timestamps and get its (sensor, local) image-minus-event differences
+        to the counterparts of its region that arrived within max_time_diff_ms (region lock held).
+        """
+        recent = self.region_recent[region_name]
+        local, sensor = data.timestamp_ms_local, data.timestamp_ms
+        own, others = recent[kind], recent["image" if kind == "event" else "event"]
+        own.append((local, sensor))
+        for buffer in (own, others):
+            while buffer and buffer[0][0] < local - self.max_time_diff_ms:
+                buffer.popleft()
+        sign = 1 if kind == "image" else -1
+        return [(sign * (sensor - other_sensor), sign * (local - other_local))
+                for other_local, other_sensor in others if abs(local - other_local) <= self.max_time_diff_ms]
+
+    def _update_offset(self, differences: List[tuple]) -> None:
+        """
+        Add timestamp differences to the offset histogram and re-estimate the clock offset
+        and the pipeline delay from the peak of the sensor differences and, in nearest mode,
+        the image latency from the peak of the local differences.
+        """
+        if not differences:
+            return
+        with self._offset_lock:
+            self._offset_diffs.extend(differences)
+            self._offset_new += len(differences)
+            if self._offset_new < self.OFFSET_UPDATE_INTERVAL:
+                return
+            self._offset_new = 0
+
+            diffs = np.asarray(self._offset_diffs, dtype=np.float64)
+            sensor, local = diffs[:, 0], diffs[:, 1]
+            if self.match_mode == "nearest":
+                in_peak, usable = self._histogram_peak(local)
+                if usable:
+                    self.image_latency_ms = float(np.median(local[in_peak]))
+            if self.use_local_timestamp:
+                return
+
+            in_peak, usable = self._histogram_peak(sensor)
+            was_ready = self.sensor_clock_ready
+            self.clock_offset_ms = float(np.median(sensor[in_peak]))
+            self.pipeline_delay_ms = float(np.percentile(
+                np.abs(local[in_peak] - sensor[in_peak] + self.clock_offset_ms), 99))
+            self._offset_usable = usable
+            if not was_ready and self.sensor_clock_ready:
+                self._clock_outcomes["sensor"].clear()
+                self._sensor_residuals.clear()
+                logger.info(
+                    f"Switching to sensor clock matching, offset {self.clock_offset_ms:.1f} ms, window {self.sensor_time_diff_ms} ms")
+
+    def _histogram_peak(self, values: np.ndarray) -> tuple:
+        """
+        Find the peak of a histogram of timestamp differences.
+
+        Returns:
+            tuple: Mask of the differences in the peak bin and its neighbours, and whether the peak
+                holds min_offset_samples differences and stands out from every other peak.
+        """
+        # Support of a bin: the differences in it and its two neighbours
+        bins = np.floor(values / self.offset_bin_ms).astype(np.int64)
+        keys, counts = np.unique(bins, return_counts=True)
+        cumulative = np.concatenate(([0], np.cumsum(counts)))
+        support = cumulative[np.searchsorted(keys, keys + 1, side='right')] - \
+            cumulative[np.searchsorted(keys, keys - 1, side='left')]
+        peak = int(np.argmax(support))
+        others = support[np.abs(keys - keys[peak]) > 2]
+        runner_up = others.max() if len(others) else 0
+        usable = support[peak] >= self.min_offset_samples and support[peak] >= self.OFFSET_PEAK_RATIO * runner_up
+        return np.abs(bins - keys[peak]) <= 1, bool(usable)
+
+    def _check_clock(self, pairs: List[Dict], clock: str) -> None:
+        """
+        Record the outcome of a region's pairs on the clock they were matched on, and fall back
+        to the local clock when sensor clock matching is clearly worse than local matching.
+        """
+        if not pairs:
+            return
+        outcomes, residuals = [], []
+        for pair in pairs:
+            if pair["event"] is None or pair["image"] is None:
+                outcomes.append(0)
+                continue
+            outcomes.extend((1, 1))
+            if clock == "sensor":
+                residuals.append(self._timestamp(pair["image"], clock) - self._timestamp(pair["event"], clock))
+        with self._offset_lock:
+            self._clock_outcomes[clock].extend(outcomes)
+            self._sensor_residuals.extend(residuals)
+            sensor_outcomes = self._clock_outcomes["sensor"]
+            if clock != "sensor" or not self.sensor_clock_ready or len(sensor_outcomes) < self.min_offset_samples:
+                return
+            local_outcomes = self._clock_outcomes["local"]
+            local_rate = float(np.mean(local_outcomes)) if local_outcomes else 1.0
+            sensor_rate = float(np.mean(sensor_outcomes))
+            residual = float(np.median(np.abs(self._sensor_residuals))) if self._sensor_residuals else 0.0
+            if sensor_rate >= self.fallback_match_ratio * local_rate and residual <= self.sensor_time_diff_ms / 2:
+                return
+            logger.warning(
+                f"Sensor clock matching degraded (match rate {sensor_rate:.2f} vs {local_rate:.2f} on the local clock, "
+                f"median residual {residual:.1f} ms), falling back to the local clock")
+            self.clock_fallbacks += 1
+            self._offset_usable = False
+            self._offset_diffs.clear()
+            self._offset_new = 0
+            sensor_outcomes.clear()
+            self._sensor_residuals.clear()
+
+    def _rekey_region(self, region_name: str, clock: str) -> None:
+        """Re-key a region's buffers on another clock (region lock held)."""
+        latest = float('-inf')
+        for buffer in (self.event_map[region_name], self.image_map[region_name]):
+            items = [data for _, data in buffer.pop_front_n(len(buffer))]
+            keyed = sorted(((self._timestamp(data, clock), data) for data in items), key=lambda x: x[0])
+            for timestamp, data in keyed:
+                buffer.append(timestamp, data)
+                latest = max(latest, timestamp)
+        self.region_clock[region_name] = clock
+        self.region_now[region_name] = latest
+        self.region_seen_at[region_name] = self._monotonic_ms()
+
+    def _add(self, items: list, region_name: str, own_map: Dict[str, TimestampRingBuffer],
+             other_map: Dict[str, TimestampRingBuffer], kind: str) -> List[Dict]:
+        """Match items of one region with the configured mode, or queue them, under one lock acquisition."""
+        output_pairs = []
+        differences = []
+        with self._region_lock(region_name):
+            clock = "sensor" if self.sensor_clock_ready else "local"
+            if self.region_clock[region_name] != clock:
+                self._rekey_region(region_name, clock)
+            for data in items:
+                if self._collects_differences:
+                    differences.extend(self._collect_differences(region_name, data, kind))
+                timestamp = self._timestamp(data, clock)
+                self.region_now[region_name] = max(self.region_now[region_name], timestamp)
+                self.region_seen_at[region_name] = self._monotonic_ms()
+                if self.match_mode == "nearest":
+                    self._append(own_map[region_name], timestamp, data, region_name, kind)
+                    output_pairs.extend(self._match_nearest(region_name))
+                else:
+                    output_pairs.extend(
+                        self._match_first(data, timestamp, region_name, own_map, other_map, kind))
+            self._account(region_name, output_pairs)
+            self._schedule_expiry(region_name)
+        self._update_offset(differences)
+        if not self.use_local_timestamp:
+            self._check_clock(output_pairs, clock)
+        return output_pairs
+
+    def _add_batch(self, batch: list, data_type: type, own_map: Dict[str, TimestampRingBuffer],
+                   other_map: Dict[str, TimestampRingBuffer], kind: str) -> List[Dict]:
+        """Group a batch by region, keeping arrival order within each region, and match each group."""
+        groups: Dict[str, list] = {}
+        for data in batch:
+            if not isinstance(data, data_type):
+                logger.error(f"Invalid data type: expected {data_type.__name__}")
+                continue
+            if getattr(data, 'region_name', None) is None:
+                logger.error(f"{data_type.__name__} must have a valid region_name")
+                continue
+            groups.setdefault(data.region_name, []).append(data)
+
+        output_pairs = []
+        for region_name, items in groups.items():
+            output_pairs.extend(self._add(items, region_name, own_map, other_map, kind))
+        return output_pairs
+
+    def _append(self, buffer: TimestampRingBuffer, timestamp: float, data, region_name: str, kind: str) -> None:
+        """Queue an item, the oldest item is dropped when the buffer is full."""
+        if buffer.append(timestamp, data) is not None:
+            counters = self.region_counters[region_name]
+            counters[f'evicted_{kind}s'] += 1
+            # Sampled: the first eviction and every 1000th after it
+            if counters[f'evicted_{kind}s'] % 1000 == 1:
+                logger.warning("%s buffer for region %s is full, dropping oldest data (%d dropped so far)",
+                               kind.capitalize(), region_name, counters[f'evicted_{kind}s'])
+
+    def _account(self, region_name: str, pairs: List[Dict]) -> None:
+        """Count matched and dropped items of a region (region lock held)."""
+        counters = self.region_counters[region_name]
+        for pair in pairs:
+            if pair["event"] is None:
+                counters['dropped_images'] += 1
+            elif pair["image"] is None:
+                counters['dropped_events'] += 1
+            else:
+                counters['matched'] += 1
+
+    def _match_first(self, data, timestamp: float, region_name: str, own_map: Dict[str, TimestampRingBuffer],
+                     other_map: Dict[str, TimestampRingBuffer], kind: str) -> List[Dict]:
+        """
+        Match an item with the oldest counterpart inside the window, or queue it.
+
+        Both buffers are sorted by timestamp, so the counterparts too old to ever
+        match form a prefix found by bisect and are dropped in one pop; the item
+        then matches the oldest remaining counterpart if it lies within the window.
+        """
+        other_kind = "image" if kind == "event" else "event"
+        output_pairs = []
+
+        others = other_map[region_name]
+        if len(others) > 0:
+            # Explain:
+            # Counterparts older than timestamp - max diff (- grace on the sensor clock) can't be matched any more, remove them
+            # If the oldest counterpart not older than timestamp - max diff is later than timestamp + max diff,
+            # this item can't be matched
+            # Else, we have a match
+            expired = others.bisect_left(timestamp - self._window_ms(region_name) - self._grace_ms(region_name))
+            for other_timestamp, other_data in others.pop_front_n(expired):
+                output_pairs.append({kind: None, other_kind: other_data})
+                logger.debug("Dropping %s with timestamp %s for region %s",
+                             type(other_data).__name__, other_timestamp, region_name)
+
+            # Counterparts inside the grace period are kept for later items of this kind but can't match this one
+            first = others.bisect_left(timestamp - self._window_ms(region_name))
+            if first < len(others):
+                other_timestamp, _ = others.peek(first)
+                if other_timestamp <= timestamp + self._window_ms(region_name):
+                    _, other_data = others.pop_at(first)
+                    output_pairs.append({kind: data, other_kind: other_data})
+                    self.match_latency[region_name].observe(timestamp - other_timestamp)
+                    logger.debug("Matched %s with timestamp %s to queued %s with timestamp %s for region %s",
+                                 type(data).__name__, timestamp, type(other_data).__name__, other_timestamp,
+                                 region_name)
+                    return output_pairs
+
+        self._append(own_map[region_name], timestamp, data, region_name, kind)
+        return output_pairs
+
+    def _candidate_pairs(self, event_ts: np.ndarray, image_ts: np.ndarray, window_ms: float):
+        """All event/image index pairs inside the window, sorted by time difference."""
+        lo = np.searchsorted(image_ts, event_ts - window_ms, side='left')
+        hi = np.searchsorted(image_ts, event_ts + window_ms, side='right')
+        counts = hi - lo
+        cand_event = np.repeat(np.arange(len(event_ts)), counts)
+        starts = np.repeat(np.cumsum(counts) - counts, counts)
+        cand_image = np.arange(len(cand_event)) - starts + np.repeat(lo, counts)
+        cand_dt = np.abs(event_ts[cand_event] - image_ts[cand_image])
+        order = np.argsort(cand_dt, kind='stable')
+        return cand_event[order], cand_image[order], cand_dt[order]
+
+    def _match_nearest(self, region_name: str) -> List[Dict]:
+        """
+        Pair the queued items of a region by the smallest time difference.
+
+        Candidate pairs inside the window are taken greedily in increasing time
+        difference. A pair is final once no later arrival can be closer to its
+        later member (difference <= now - later timestamp) or once the later
+        member has waited `lookahead_ms`; a pair that is not final yet reserves
+        both items until a later call, and the earliest time one becomes final
+        is kept for the expiry schedule. Items older than the window that are
+        neither matched nor reserved are dropped.
+        """
+        events = self.event_map[region_name]
+        images = self.image_map[region_name]
+        # Items of the later-arriving stream may still be up to the grace period behind
+        now = self.region_now[region_name] - self._grace_ms(region_name)
+        output_pairs = []
+
+        event_ts = np.array(events.timestamps)
+        image_ts = np.array(images.timestamps)
+        reserved_events = np.zeros(len(event_ts), dtype=bool)
+        reserved_images = np.zeros(len(image_ts), dtype=bool)
+        matches = []
+        pair_due = float('inf')
+        if len(event_ts) and len(image_ts):
+            for e, i, dt in zip(*self._candidate_pairs(event_ts, image_ts, self._window_ms(region_name))):
+                if reserved_events[e] or reserved_images[i]:
+                    continue
+                reserved_events[e] = reserved_images[i] = True
+                later = max(event_ts[e], image_ts[i])
+                waited = now - later
+                if dt <= waited or waited >= self.lookahead_ms:
+                    matches.append((e, i))
+                else:
+                    pair_due = min(pair_due, later + min(dt, self.lookahead_ms))
+        self.region_pair_due[region_name] = pair_due if pair_due < float('inf') else None
+
+        # Matched items leave the buffers, unreserved items older than the window can't be matched any more
+        matched_events = {e for e, _ in matches}
+        matched_images = {i for _, i in matches}
+        expired_events = (event_ts < now - self._window_ms(region_name)) & ~reserved_events
+        expired_images = (image_ts < now - self._window_ms(region_name)) & ~reserved_images
+        pop_events = sorted(matched_events.union(np.nonzero(expired_events)[0].tolist()), reverse=True)
+        pop_images = sorted(matched_images.union(np.nonzero(expired_images)[0].tolist()), reverse=True)
+        # Pop from the back so the remaining indices stay valid
+        event_items = {e: events.pop_at(e)[1] for e in pop_events}
+        image_items = {i: images.pop_at(i)[1] for i in pop_images}
+
+        for e in np.nonzero(expired_events)[0]:
+            output_pairs.append({"event": event_items[e], "image": None})
+            logger.debug("Dropping EventData with timestamp %s for region %s", event_ts[e], region_name)
+        for i in np.nonzero(expired_images)[0]:
+            output_pairs.append({"event": None, "image": image_items[i]})
+            logger.debug("Dropping ImageData with timestamp %s for region %s", image_ts[i], region_name)
+        for e, i in sorted(matches):
+            output_pairs.append({"event": event_items[e], "image": image_items[i]})
+            self.match_latency[region_name].observe(now - min(event_ts[e], image_ts[i]))
+            logger.debug("Matched EventData with timestamp %s to ImageData with timestamp %s for region %s",
+                         event_ts[e], image_ts[i], region_name)
+
+        return output_pairs
 
     def add_event_data(self, event_data: EventData) -> List[Dict]:
         """
@@ -65,54 +595,7 @@ class Matcher:
             logger.error("EventData must have a valid region_name")
             return []
 
-        region_name = event_data.region_name
-
-        output_pairs = []
-
-        with self.map_lock:
-            if region_name in self.image_map:
-                while len(self.image_map[region_name]) > 0:
-                    image_data = self.image_map[region_name][0]
-                    # if self.use_local_timestamp:
-                    # Explain:
-                    # If event timestamp is later than image timestamp + max diff, image can't be matched, remove it
-                    # If event timestamp + max diff is earlier than image timestamp, event can't be matched, stop checking
-                    # Else, we have a match
-                    if event_data.timestamp_ms_local > image_data.timestamp_ms_local + self.max_time_diff_ms:
-                        image_data_to_remove = self.image_map[region_name].pop(
-                            0)
-                        output_pairs.append(
-                            {"event": None, "image": image_data_to_remove})
-                        logger.info(
-                            f"Dropping ImageData with local timestamp {image_data_to_remove.timestamp_ms_local} for region {region_name}")
-                    elif event_data.timestamp_ms_local + self.max_time_diff_ms < image_data.timestamp_ms_local:
-                        break
-                    else:
-                        image_data_to_match = self.image_map[region_name].pop(
-                            0)
-                        output_pairs.append(
-                            {"event": event_data, "image": image_data_to_match})
-                        logger.info(
-                            f"Matched EventData with local timestamp {event_data.timestamp_ms_local} to ImageData with local timestamp {image_data_to_match.timestamp_ms_local} for region {region_name}")
-                        return output_pairs
-                    # else:
-                    #     pass
-
-            # Initialize list if region_name not in map
-            if region_name not in self.event_map:
-                self.event_map[region_name] = []
-
-            # Check if the list for this region is full
-            if len(self.event_map[region_name]) >= self.max_queue_size:
-                logger.warning(
-                    f"Event list for region {region_name} is full, dropping oldest data")
-                # Remove oldest data
-                self.event_map[region_name].pop(0)
-
-            # Add new event data to the end of the list
-            self.event_map[region_name].append(event_data)
-
-        return output_pairs
+        return self._add([event_data], event_data.region_name, self.event_map, self.image_map, "event")
 
     def add_image_data(self, image_data: ImageData) -> List[Dict]:
         """
@@ -132,58 +615,199 @@ class Matcher:
             logger.error("ImageData must have a valid region_name")
             return []
 
-        region_name = image_data.region_name
+        return self._add([image_data], image_data.region_name, self.image_map, self.event_map, "image")
+
+    def add_events(self, events: List[EventData]) -> List[Dict]:
+        """
+        Add a batch of EventData, e.g. all events of one BaseEvents message.
+
+        Each region's lock is taken once for the whole batch.
+
+        Args:
+            events (List[EventData]): The EventData to add, in arrival order.
+
+        Returns:
+            List[Dict]: All matched pairs of the batch, each pair is a dictionary with "event" and "image" keys.
+        """
+        return self._add_batch(events, EventData, self.event_map, self.image_map, "event")
+
+    def add_images(self, images: List[ImageData]) -> List[Dict]:
+        """
+        Add a batch of ImageData, e.g. all triggered images of one frame.
+
+        Each region's lock is taken once for the whole batch.
+
+        Args:
+            images (List[ImageData]): The ImageData to add, in arrival order.
+
+        Returns:
+            List[Dict]: All matched pairs of the batch, each pair is a dictionary with "event" and "image" keys.
+        """
+        return self._add_batch(images, ImageData, self.image_map, self.event_map, "image")
+
+    @staticmethod
+    def _monotonic_ms() -> float:
+        return time.monotonic() * 1000
+
+    def set_result_sink(self, sink: Optional[Callable[[List[Dict]], None]]) -> None:
+        """
+        Set the callable receiving the pairs produced by the expiry sweeper.
+
+        Args:
+            sink (Optional[Callable[[List[Dict]], None]]): Called once per sweep with all its pairs.
+        """
+        self.result_sink = sink
+
+    def _schedule_expiry(self, region_name: str) -> None:
+        """
+        Schedule a sweep of a region for when its oldest item leaves the window or, in nearest
+        mode, when its first reserved pair becomes final (region lock held).
+        """
+        fronts = [buffer.peek()[0] for buffer in (self.event_map[region_name], self.image_map[region_name])
+                  if len(buffer) > 0]
+        if not fronts:
+            return
+        now_mono = self._monotonic_ms()
+        # Monotonic time at which the region clock, less the grace period, reaches a timestamp: timestamp + to_mono
+        to_mono = self.region_seen_at[region_name] - self.region_now[region_name] + self._grace_ms(region_name)
+        due = min(fronts) + self._window_ms(region_name) + to_mono
+        if self.match_mode == "nearest":
+            pair_due = self.region_pair_due[region_name]
+            if pair_due is not None:
+                # An oldest item past the window is reserved by a pair, nothing expires before that pair is final
+                due = pair_due + to_mono if due <= now_mono else min(due, pair_due + to_mono)
+            elif due <= now_mono:
+                due = now_mono + self.lookahead_ms
+        wake = False
+        with self._expiry_lock:
+            if due < self._expiry_due.get(region_name, float('inf')):
+                self._expiry_due[region_name] = due
+                heapq.heappush(self._expiry_heap, (due, next(self._expiry_seq), region_name))
+                wake = self._expiry_heap[0][0] == due
+        if wake:
+            self._sweeper_wake.set()
+
+    def _expire_region(self, region_name: str, now_mono: float) -> List[Dict]:
+        """Advance a region's clock to now and drop (or, in nearest mode, settle) its expired items."""
+        now = self.region_now[region_name] + now_mono - self.region_seen_at[region_name]
+        self.region_now[region_name] = now
+        self.region_seen_at[region_name] = now_mono
+        if self.match_mode == "nearest":
+            return self._match_nearest(region_name)
 
         output_pairs = []
-        with self.map_lock:
-            if region_name in self.event_map:
-                while len(self.event_map[region_name]) > 0:
-                    event_data = self.event_map[region_name][0]
-                    # if self.use_local_timestamp:
-                    # Explain:
-                    # If image timestamp is later than event timestamp + max diff, event can't be matched, remove it
-                    # If image timestamp + max diff is earlier than event timestamp, image can't be matched, stop checking
-                    # Else, we have a match
-                    if image_data.timestamp_ms_local > event_data.timestamp_ms_local + self.max_time_diff_ms:
-                        event_data_to_remove = self.event_map[region_name].pop(
-                            0)
-                        output_pairs.append(
-                            {"event": event_data_to_remove, "image": None})
-                        logger.info(
-                            f"Dropping EventData with local timestamp {event_data_to_remove.timestamp_ms_local} for region {region_name}")
-                    elif image_data.timestamp_ms_local + self.max_time_diff_ms < event_data.timestamp_ms_local:
-                        break
-                    else:
-                        event_data_to_match = self.event_map[region_name].pop(
-                            0)
-                        output_pairs.append(
-                            {"event": event_data_to_match, "image": image_data})
-                        logger.info(
-                            f"Matched EventData with local timestamp {event_data_to_match.timestamp_ms_local} to ImageData with local timestamp {image_data.timestamp_ms_local} for region {region_name}")
-                        return output_pairs
-                    # else:
-                    #     pass
-
-            # Initialize list if region_name not in map
-            if region_name not in self.image_map:
-                self.image_map[region_name] = []
-
-            # Check if the list for this region is full
-            if len(self.image_map[region_name]) >= self.max_queue_size:
-                logger.warning(
-                    f"Image list for region {region_name} is full, dropping oldest data")
-                # Remove oldest data
-                self.image_map[region_name].pop(0)
-
-            # Add new image data to the end of the list
-            self.image_map[region_name].append(image_data)
+        cutoff = now - self._window_ms(region_name) - self._grace_ms(region_name)
+        for kind, buffer in (("event", self.event_map[region_name]), ("image", self.image_map[region_name])):
+            expired = buffer.bisect_left(cutoff)
+            for timestamp, data in buffer.pop_front_n(expired):
+                output_pairs.append({"event": data, "image": None} if kind == "event" else {"event": None, "image": data})
+                logger.debug("Dropping %s with timestamp %s for region %s", type(data).__name__, timestamp, region_name)
+        return output_pairs
+
+    def sweep(self) -> List[Dict]:
+        """
+        Expire the items that left the window, in O(expired + log regions).
+
+        The pairs are passed to the result sink in one batch.
 
+        Returns:
+            List[Dict]: Dropped items (and nearest-mode matches) produced by this sweep.
+        """
+        now_mono = self._monotonic_ms()
+        regions = []
+        with self._expiry_lock:
+            while self._expiry_heap and self._expiry_heap[0][0] <= now_mono:
+                due, _, region_name = heapq.heappop(self._expiry_heap)
+                if self._expiry_due.get(region_name) != due:
+                    continue
+                del self._expiry_due[region_name]
+                regions.append(region_name)
+
+        output_pairs = []
+        for region_name in regions:
+            with self._region_lock(region_name):
+                expired_pairs = self._expire_region(region_name, now_mono)
+                self._account(region_name, expired_pairs)
+                self._schedule_expiry(region_name)
+                clock = self.region_clock[region_name]
+            if not self.use_local_timestamp:
+                self._check_clock(expired_pairs, clock)
+            output_pairs.extend(expired_pairs)
+
+        sink = self.result_sink
+        if output_pairs and sink is not None:
+            try:
+                sink(output_pairs)
+            except Exception as e:
+                logger.error(f"Error in Matcher result sink: {e}")
         return output_pairs
 
+    def _sweeper(self):
+        """
+        Sweeper thread expiring unmatched items on quiet regions; it sleeps until the
+        earliest scheduled expiry, at most `sweep_interval_ms`.
+        """
+        while not self._sweeper_stop.is_set():
+            with self._expiry_lock:
+                next_due = self._expiry_heap[0][0] if self._expiry_heap else float('inf')
+            timeout_ms = min(self.sweep_interval_ms, max(0.0, next_due - self._monotonic_ms()))
+            self._sweeper_wake.wait(timeout_ms / 1000.0)
+            self._sweeper_wake.clear()
+            if self._sweeper_stop.is_set():
+                break
+            self.sweep()
+
+    def stop(self):
+        """
+        Stop the expiry sweeper thread.
+        """
+        self._sweeper_stop.set()
+        self._sweeper_wake.set()
+        if self._sweeper_thread is not None and self._sweeper_thread.is_alive():
+            self._sweeper_thread.join(timeout=5.0)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Get the matching metrics.
+
+        Returns:
+            Dict[str, Any]: Per region: pending depth, matched/dropped/evicted counters, lock
+                statistics and match latency (ms on the matching clock, from the earlier item
+                of a pair to the pairing); plus the sensor clock state, pipeline delay, the
+                nearest-mode image latency and the number of fallbacks from the sensor clock
+                to the local clock.
+        """
+        lock_stats = self.get_lock_stats()
+        regions = {}
+        for region_name, locks in lock_stats.items():
+            regions[region_name] = {
+                'pending_events': len(self.event_map[region_name]),
+                'pending_images': len(self.image_map[region_name]),
+                **self.region_counters[region_name],
+                'lock_acquisitions': locks['acquisitions'],
+                'lock_contentions': locks['contentions'],
+                'match_latency_ms': self.match_latency[region_name].snapshot(),
+            }
+        return {
+            'regions': regions,
+            'match_mode': self.match_mode,
+            'sensor_clock': self.sensor_clock_ready,
+            'clock_offset_ms': self.clock_offset_ms,
+            'pipeline_delay_ms': self.pipeline_delay_ms,
+            'image_latency_ms': self.image_latency_ms,
+            'clock_fallbacks': self.clock_fallbacks,
+        }
+
     def clear_queues(self):
         """
         Clear both maps, removing all stored data.
         """
         with self.map_lock:
-            self.event_map.clear()
-            self.image_map.clear()
+            regions = list(self.region_locks)
+        for region_name in regions:
+            with self._region_lock(region_name):
+                self.event_map[region_name].clear()
+                self.image_map[region_name].clear()
+                self.region_pair_due[region_name] = None
+                for recent in self.region_recent[region_name].values():
+                    recent.clear()
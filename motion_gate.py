@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MotionGate class for skipping detection on frames where the lane ROI is static.
+"""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MotionGate:
+    """
+    A cheap pre-filter in front of Tracker.
+
+    Each frame is cropped to the lane ROI, downscaled and converted to grayscale,
+    then compared against a running-average background. Detection is only needed
+    when the fraction of changed ROI pixels (motion energy) reaches a threshold.
+    """
+
+    def __init__(self,
+                 roi_polygons: Optional[List[np.ndarray]] = None,
+                 downscale: float = 0.25,
+                 pixel_threshold: int = 25,
+                 energy_threshold: float = 0.002,
+                 background_rate: float = 0.05,
+                 max_skipped_frames: int = 50,
+                 report_interval: int = 1000):
+        """
+        Initialize the MotionGate.
+
+        Args:
+            roi_polygons (Optional[List[np.ndarray]]): Lane polygons (N x 2, frame coordinates). None uses the full frame.
+            downscale (float): Resize factor applied to the ROI crop before differencing.
+            pixel_threshold (int): Minimum gray-level difference for a pixel to count as moving.
+            energy_threshold (float): Minimum fraction of moving ROI pixels to run detection.
+            background_rate (float): Learning rate of the running-average background.
+            max_skipped_frames (int): Force a detection after this many consecutive skipped frames.
+            report_interval (int): Log the skip ratio every N frames (0 disables logging).
+        """
+        self.downscale = downscale
+        self.pixel_threshold = pixel_threshold
+        self.energy_threshold = energy_threshold
+        self.background_rate = background_rate
+        self.max_skipped_frames = max_skipped_frames
+        self.report_interval = report_interval
+
+        self.roi_polygons = roi_polygons
+        self._frame_shape = None
+        self._crop = None
+        self._mask = None
+        self._mask_pixels = 0
+        self._background = None
+        self._skipped_streak = 0
+
+        self.frames = 0
+        self.skipped = 0
+        self.last_energy = 0.0
+
+    def set_roi(self, roi_polygons: Optional[List[np.ndarray]]) -> None:
+        """
+        Replace the lane ROI; the mask and background are rebuilt on the next frame.
+
+        Args:
+            roi_polygons (Optional[List[np.ndarray]]): Lane polygons in frame coordinates, None for the full frame.
+        """
+        self.roi_polygons = roi_polygons
+        self._frame_shape = None
+
+    def _build_roi(self, frame_shape: tuple) -> None:
+        """Compute the ROI crop rectangle and the downscaled polygon mask for a frame shape."""
+        height, width = frame_shape[:2]
+        polygons = [np.asarray(p, dtype=np.float64) for p in (self.roi_polygons or []) if len(p) >= 3]
+
+        if polygons:
+            points = np.vstack(polygons)
+            x0 = int(np.clip(np.floor(points[:, 0].min()), 0, width - 1))
+            y0 = int(np.clip(np.floor(points[:, 1].min()), 0, height - 1))
+            x1 = int(np.clip(np.ceil(points[:, 0].max()), x0 + 1, width))
+            y1 = int(np.clip(np.ceil(points[:, 1].max()), y0 + 1, height))
+        else:
+            x0, y0, x1, y1 = 0, 0, width, height
+
+        small_w = max(1, int(round((x1 - x0) * self.downscale)))
+        small_h = max(1, int(round((y1 - y0) * self.downscale)))
+        mask = np.zeros((small_h, small_w), dtype=np.uint8)
+        if polygons:
+            scale = np.array([small_w / (x1 - x0), small_h / (y1 - y0)])
+            cv2.fillPoly(mask, [np.round((p - [x0, y0]) * scale).astype(np.int32) for p in polygons], 1)
+        else:
+            mask[:] = 1
+
+        self._frame_shape = frame_shape
+        self._crop = (x0, y0, x1, y1)
+        self._mask = mask.astype(bool)
+        self._mask_pixels = max(1, int(self._mask.sum()))
+        self._background = None
+
+    def _preprocess(self, image: np.ndarray) -> np.ndarray:
+        """Crop to the ROI, downscale and convert to grayscale."""
+        x0, y0, x1, y1 = self._crop
+        small = cv2.resize(image[y0:y1, x0:x1], (self._mask.shape[1], self._mask.shape[0]),
+                           interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def has_motion(self, image: np.ndarray) -> bool:
+        """
+        Update the background with a frame and decide whether it needs detection.
+
+        Args:
+            image (np.ndarray): Input image in BGR format.
+
+        Returns:
+            bool: True if detection should run on this frame.
+        """
+        if self._frame_shape != image.shape:
+            self._build_roi(image.shape)
+
+        gray = self._preprocess(image)
+        self.frames += 1
+
+        if self._background is None:
+            self._background = gray.astype(np.float32)
+            energy = 1.0
+        else:
+            diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+            moving = (diff > self.pixel_threshold) & self._mask
+            energy = float(np.count_nonzero(moving)) / self._mask_pixels
+            cv2.accumulateWeighted(gray, self._background, self.background_rate)
+        self.last_energy = energy
+
+        run_detection = energy >= self.energy_threshold or self._skipped_streak >= self.max_skipped_frames
+        if run_detection:
+            self._skipped_streak = 0
+        else:
+            self._skipped_streak += 1
+            self.skipped += 1
+
+        if self.report_interval and self.frames % self.report_interval == 0:
+            stats = self.get_stats()
+            logger.info(
+                f"MotionGate skipped {stats['skipped']}/{stats['frames']} frames (skip ratio {stats['skip_ratio']:.2%})")
+
+        return run_detection
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get skip statistics.
+
+        Returns:
+            Dict[str, Any]: Frame count, skipped count, skip ratio and last motion energy.
+        """
+        frames = self.frames
+        skipped = self.skipped
+        return {
+            'frames': frames,
+            'skipped': skipped,
+            'skip_ratio': skipped / frames if frames else 0.0,
+            'last_energy': self.last_energy,
+            'energy_threshold': self.energy_threshold
+        }
+
+    def reset(self) -> None:
+        """
+        Reset the background and statistics.
+        """
+        self._frame_shape = None
+        self._background = None
+        self._skipped_streak = 0
+        self.frames = 0
+        self.skipped = 0
+        self.last_energy = 0.0
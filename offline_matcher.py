@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Offline matching of event and triggered-image timestamps known up front (e.g. a whole record).
+
+Events and images of a region are paired in rounds of mutual nearest neighbours:
+in each round every remaining event finds its nearest remaining image and every
+image its nearest event with searchsorted, and the pairs that choose each other
+are matched. Rounds repeat until no pair is left inside the window. This is the
+greedy nearest-timestamp matching of Matcher(match_mode="nearest") with the whole
+record as lookahead.
+
+Pairs further apart than the window never affect the pairs inside it, so the
+matching without a window, filtered by |dt| <= max_time_diff_ms, equals the
+windowed matching. sweep_time_diff() uses this to evaluate many windows in one pass.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+@dataclass
+class OfflineMatchResult:
+    """Pairs and leftovers of one region; indices refer to the input arrays."""
+    pairs: np.ndarray               # (K, 2) event index, image index
+    time_diffs: np.ndarray          # (K,) image timestamp - event timestamp
+    unmatched_events: np.ndarray    # event indices without an image
+    unmatched_images: np.ndarray    # image indices without an event
+
+
+def _nearest(timestamps: np.ndarray, others: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """For each timestamp, the index of and distance to the nearest of `others` (both sorted, others non-empty)."""
+    idx = np.searchsorted(others, timestamps)
+    left = np.clip(idx - 1, 0, len(others) - 1)
+    right = np.clip(idx, 0, len(others) - 1)
+    left_dt = np.abs(timestamps - others[left])
+    right_dt = np.abs(others[right] - timestamps)
+    use_right = right_dt < left_dt
+    return np.where(use_right, right, left), np.where(use_right, right_dt, left_dt)
+
+
+def _mutual_nearest(event_ts: np.ndarray, image_ts: np.ndarray,
+                    max_time_diff_ms: Optional[float]) -> Tuple[np.ndarray, np.ndarray]:
+    """Mutual-nearest rounds over sorted timestamps; returns matched (event, image) positions in the sorted arrays."""
+    event_left = np.arange(len(event_ts))
+    image_left = np.arange(len(image_ts))
+    matched_events: List[np.ndarray] = []
+    matched_images: List[np.ndarray] = []
+
+    while len(event_left) and len(image_left):
+        e_ts = event_ts[event_left]
+        i_ts = image_ts[image_left]
+        image_of_event, dt = _nearest(e_ts, i_ts)
+        event_of_image, _ = _nearest(i_ts, e_ts)
+
+        mutual = event_of_image[image_of_event] == np.arange(len(e_ts))
+        if max_time_diff_ms is not None:
+            mutual &= dt <= max_time_diff_ms
+        if not mutual.any():
+            break
+
+        e_pos = np.nonzero(mutual)[0]
+        i_pos = image_of_event[e_pos]
+        matched_events.append(event_left[e_pos])
+        matched_images.append(image_left[i_pos])
+
+        keep_events = np.ones(len(event_left), dtype=bool)
+        keep_events[e_pos] = False
+        keep_images = np.ones(len(image_left), dtype=bool)
+        keep_images[i_pos] = False
+        event_left = event_left[keep_events]
+        image_left = image_left[keep_images]
+
+    if not matched_events:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(matched_events), np.concatenate(matched_images)
+
+
+def match_offline(event_timestamps: Iterable[float], image_timestamps: Iterable[float],
+                  max_time_diff_ms: Optional[float] = 5000) -> OfflineMatchResult:
+    """
+    Match the events and triggered images of one region.
+
+    Args:
+        event_timestamps (Iterable[float]): Event timestamps in ms, any order.
+        image_timestamps (Iterable[float]): Triggered image timestamps in ms, any order.
+        max_time_diff_ms (Optional[float]): Matching window, None for no window.
+
+    Returns:
+        OfflineMatchResult: Pairs sorted by event timestamp, and unmatched indices.
+    """
+    event_ts = np.asarray(event_timestamps, dtype=np.float64).reshape(-1)
+    image_ts = np.asarray(image_timestamps, dtype=np.float64).reshape(-1)
+    event_order = np.argsort(event_ts, kind='stable')
+    image_order = np.argsort(image_ts, kind='stable')
+
+    e_pos, i_pos = _mutual_nearest(event_ts[event_order], image_ts[image_order], max_time_diff_ms)
+    by_event = np.argsort(e_pos, kind='stable')
+    events = event_order[e_pos[by_event]]
+    images = image_order[i_pos[by_event]]
+
+    unmatched_events = np.ones(len(event_ts), dtype=bool)
+    unmatched_events[events] = False
+    unmatched_images = np.ones(len(image_ts), dtype=bool)
+    unmatched_images[images] = False
+    return OfflineMatchResult(pairs=np.column_stack([events, images]).astype(np.int64).reshape(-1, 2),
+                              time_diffs=image_ts[images] - event_ts[events],
+                              unmatched_events=np.nonzero(unmatched_events)[0],
+                              unmatched_images=np.nonzero(unmatched_images)[0])
+
+
+def match_offline_regions(event_timestamps: Dict[str, Iterable[float]],
+                          image_timestamps: Dict[str, Iterable[float]],
+                          max_time_diff_ms: Optional[float] = 5000) -> Dict[str, OfflineMatchResult]:
+    """
+    Match every region; a region present on one side only leaves all its items unmatched.
+
+    Args:
+        event_timestamps (Dict[str, Iterable[float]]): Event timestamps, key: region_name.
+        image_timestamps (Dict[str, Iterable[float]]): Triggered image timestamps, key: region_name.
+        max_time_diff_ms (Optional[float]): Matching window, None for no window.
+
+    Returns:
+        Dict[str, OfflineMatchResult]: Result per region_name.
+    """
+    regions = sorted(set(event_timestamps) | set(image_timestamps))
+    return {region_name: match_offline(event_timestamps.get(region_name, []),
+                                       image_timestamps.get(region_name, []),
+                                       max_time_diff_ms)
+            for region_name in regions}
+
+
+def sweep_time_diff(event_timestamps: Dict[str, Iterable[float]],
+                    image_timestamps: Dict[str, Iterable[float]],
+                    time_diffs_ms: Iterable[float]) -> List[Dict[str, float]]:
+    """
+    Evaluate many matching windows with one unwindowed matching per region, for calibration.
+
+    Args:
+        event_timestamps (Dict[str, Iterable[float]]): Event timestamps, key: region_name.
+        image_timestamps (Dict[str, Iterable[float]]): Triggered image timestamps, key: region_name.
+        time_diffs_ms (Iterable[float]): Windows to evaluate.
+
+    Returns:
+        List[Dict[str, float]]: Per window: matched pairs, unmatched events and images,
+            and the median |dt| of the matched pairs.
+    """
+    results = match_offline_regions(event_timestamps, image_timestamps, max_time_diff_ms=None)
+    abs_dt = np.sort(np.abs(np.concatenate([r.time_diffs for r in results.values()] or [np.empty(0)])))
+    total_events = sum(len(r.pairs) + len(r.unmatched_events) for r in results.values())
+    total_images = sum(len(r.pairs) + len(r.unmatched_images) for r in results.values())
+
+    rows = []
+    for window in time_diffs_ms:
+        matched = int(np.searchsorted(abs_dt, window, side='right'))
+        rows.append({
+            'max_time_diff_ms': float(window),
+            'matched': matched,
+            'unmatched_events': total_events - matched,
+            'unmatched_images': total_images - matched,
+            'median_abs_dt_ms': float(np.median(abs_dt[:matched])) if matched else 0.0,
+        })
+    return rows
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ResultsStore class: an indexed SQLite table of matched results.
+
+The database runs in WAL mode, so the save worker can insert batches while
+the web API reads pages and aggregates without loading all results in memory.
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Match status of a result row
+STATUS_MATCHED = 'matched'
+STATUS_EVENT_ONLY = 'event_only'
+STATUS_IMAGE_ONLY = 'image_only'
+
+RESULT_FIELDS = [
+    'region_name', 'status', 'timestamp_ms',
+    'event_timestamp_ms', 'event_timestamp_ms_local', 'image_timestamp_ms', 'image_timestamp_ms_local',
+    'image_filename', 'pointcloud_filename', 'created_ms'
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    region_name TEXT,
+    status TEXT NOT NULL,
+    timestamp_ms INTEGER,
+    event_timestamp_ms INTEGER,
+    event_timestamp_ms_local INTEGER,
+    image_timestamp_ms INTEGER,
+    image_timestamp_ms_local INTEGER,
+    image_filename TEXT,
+    pointcloud_filename TEXT,
+    created_ms INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_results_timestamp ON results (timestamp_ms);
+CREATE INDEX IF NOT EXISTS idx_results_region_timestamp ON results (region_name, timestamp_ms);
+CREATE INDEX IF NOT EXISTS idx_results_status_timestamp ON results (status, timestamp_ms);
+"""
+
+
+class ResultsStore:
+    """
+    SQLite store of matched results.
+
+    Rows are keyed by region, match status and `timestamp_ms` (the event
+    timestamp, or the image timestamp for images without an event).
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Open (or create) the results database.
+
+        Args:
+            db_path (str): Path of the SQLite file.
+        """
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def _connect_reader(self) -> sqlite3.Connection:
+        """Short-lived read connection; WAL lets it read while the writer inserts."""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def insert(self, records: List[Dict[str, Any]]) -> None:
+        """
+        Insert a batch of results in one transaction.
+
+        Args:
+            records (List[Dict[str, Any]]): Raw results with the event/image timestamps, region
+                name and file paths; missing values are None.
+        """
+        if not records:
+            return
+        now_ms = int(time.time() * 1000)
+        rows = []
+        for record in records:
+            has_event = record.get('event_timestamp_ms') is not None
+            has_image = record.get('image_timestamp_ms') is not None
+            status = STATUS_MATCHED if has_event and has_image else (
+                STATUS_EVENT_ONLY if has_event else STATUS_IMAGE_ONLY)
+            timestamp_ms = record['event_timestamp_ms'] if has_event else record.get('image_timestamp_ms')
+            rows.append((record.get('region_name'), status, timestamp_ms,
+                         record.get('event_timestamp_ms'), record.get('event_timestamp_ms_local'),
+                         record.get('image_timestamp_ms'), record.get('image_timestamp_ms_local'),
+                         record.get('image_filename'), record.get('pointcloud_filename'), now_ms))
+        with self.lock:
+            with self.conn:
+                self.conn.executemany(
+                    f"INSERT INTO results ({', '.join(RESULT_FIELDS)}) VALUES ({', '.join('?' * len(RESULT_FIELDS))})",
+                    rows)
+
+    @staticmethod
+    def _where(region_name: Optional[str] = None, status: Optional[str] = None,
+               start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> tuple:
+        """Build the WHERE clause of the filters."""
+        clauses, params = [], []
+        if region_name is not None:
+            clauses.append("region_name = ?")
+            params.append(region_name)
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(status)
+        if start_ms is not None:
+            clauses.append("timestamp_ms >= ?")
+            params.append(start_ms)
+        if end_ms is not None:
+            clauses.append("timestamp_ms < ?")
+            params.append(end_ms)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, region_name: Optional[str] = None, status: Optional[str] = None,
+              start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+              offset: int = 0, limit: int = 100) -> Dict[str, Any]:
+        """
+        Get one page of results ordered by timestamp.
+
+        Args:
+            region_name (Optional[str]): Only this region.
+            status (Optional[str]): Only this match status.
+            start_ms (Optional[int]): Only timestamps >= start_ms.
+            end_ms (Optional[int]): Only timestamps < end_ms.
+            offset (int): Rows to skip.
+            limit (int): Maximum rows to return.
+
+        Returns:
+            Dict[str, Any]: 'total' matching rows and the page 'rows'.
+        """
+        where, params = self._where(region_name, status, start_ms, end_ms)
+        conn = self._connect_reader()
+        try:
+            total = conn.execute(f"SELECT COUNT(*) FROM results{where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT id, {', '.join(RESULT_FIELDS)} FROM results{where} "
+                f"ORDER BY timestamp_ms, id LIMIT ? OFFSET ?", params + [limit, offset]).fetchall()
+        finally:
+            conn.close()
+        return {'total': total, 'rows': [dict(row) for row in rows]}
+
+    def aggregate(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> Dict[str, Dict[str, int]]:
+        """
+        Count results per region and match status.
+
+        Args:
+            start_ms (Optional[int]): Only timestamps >= start_ms.
+            end_ms (Optional[int]): Only timestamps < end_ms.
+
+        Returns:
+            Dict[str, Dict[str, int]]: Counts per status and total, key: region_name.
+        """
+        where, params = self._where(start_ms=start_ms, end_ms=end_ms)
+        conn = self._connect_reader()
+        try:
+            rows = conn.execute(
+                f"SELECT region_name, status, COUNT(*) FROM results{where} GROUP BY region_name, status",
+                params).fetchall()
+        finally:
+            conn.close()
+        regions: Dict[str, Dict[str, int]] = {}
+        for region_name, status, count in rows:
+            stats = regions.setdefault(region_name, {STATUS_MATCHED: 0, STATUS_EVENT_ONLY: 0,
+                                                     STATUS_IMAGE_ONLY: 0, 'total': 0})
+            stats[status] = count
+            stats['total'] += count
+        return regions
+
+    def close(self) -> None:
+        """
+        Close the writer connection.
+        """
+        with self.lock:
+            self.conn.close()
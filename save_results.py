@@ -5,24 +5,60 @@
 SaveResults Class for handling and saving matched results from Matcher class.
 
 Features:
-1. Save matched results to Excel file
-2. Save images from ImageData to local files
-3. Organize saved data with timestamps and region names
+1. Append matched results to a CSV file as they arrive (fsync periodically)
+2. Index matched results in a SQLite database for paginated queries
+3. Export the results to an Excel file on demand or when stopped
+4. Save images from ImageData to local files, sharded as images/YYYYMMDD/HH/region/
+   with a manifest.jsonl per shard, synced once per batch
+5. Organize saved data with timestamps and region names
+6. Bound the memory of pending results; frames over the limit are spilled to a spool file
+   and recovered from it on the next start if the process exits before saving them
 """
 
+import csv
+import dataclasses
+import json
 import os
+import pickle
+import struct
+import time
+from collections import deque
 import cv2
 import pandas as pd
 from datetime import datetime
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 from dataclasses import dataclass
 import numpy as np
 import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
 # Import the data classes from data_adapter
 from backend.modules.camera_modules import ImageData
 from backend.modules.simpl_modules import EventData
 from parse_pointcloud import parse_point_cloud
+from results_store import ResultsStore
+from backend.utils.metrics import Histogram
+
+# Image formats: file extension and the OpenCV quality flag
+IMAGE_FORMATS = {
+    'jpg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY),
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY),
+}
+
+# Spool record header: drained flag, metadata length, frame length
+SPOOL_HEADER = struct.Struct('<BIQ')
+
+# Columns of the results CSV, in file order
+RESULT_COLUMNS = [
+    'image_timestamp_ms', 'image_timestamp_ms_local', 'event_timestamp_ms', 'event_timestamp_ms_local',
+    'region_name', 'image_filename', 'pointcloud_filename'
+]
+
+# Per-shard listing of the saved images, one JSON object per line
+MANIFEST_FILENAME = "manifest.jsonl"
+
+# Rows of an Excel sheet, including the header row
+EXCEL_MAX_ROWS = 1048576
 
 
 @dataclass
@@ -36,24 +72,79 @@ class MatchedResult:
 class SaveResults:
     """Class for saving matched results to Excel and images"""
 
-    def __init__(self, output_dir: str = "results"):
+    def __init__(self, output_dir: str = "results", fsync_interval_s: float = 5.0,
+                 image_writers: int = 4, image_format: str = "jpg", image_quality: int = 90,
+                 max_pending_bytes: int = 512 * 1024 * 1024, sync_images: bool = True):
         """
         Initialize the SaveResults class
 
         Args:
-            output_dir: Directory to save results (Excel and images)
+            output_dir: Directory to save results (CSV, Excel and images)
+            fsync_interval_s: Minimum interval between fsyncs of the results CSV
+            image_writers: Number of image writer threads (OpenCV encoding releases the GIL)
+            image_format: "jpg" or "webp"
+            image_quality: Encoding quality, 0-100
+            max_pending_bytes: Memory limit of the frames waiting to be saved; frames over the limit
+                are spilled to the spool file and read back when the worker gets to them
+            sync_images: Whether to fsync the images (on the writer threads), and the manifests and
+                shard directories of each batch
         """
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"image_format must be one of {list(IMAGE_FORMATS)}, got: {image_format}")
         # Use absolute path for output directory
         self.output_dir = os.path.abspath(output_dir)
         self.images_dir = os.path.join(self.output_dir, "images")
         self.excel_file = os.path.join(self.output_dir, "matched_results.xlsx")
-        self.results_data = []  # 用于存储已保存到Excel的结果数据
-        self.pending_save_data = []  # 用于存储待保存的数据
+        self.csv_file = os.path.join(self.output_dir, "matched_results.csv")
+        self.db_file = os.path.join(self.output_dir, "matched_results.db")
+        self.spool_file = os.path.join(self.output_dir, "pending_frames.spool")
+        self.fsync_interval_s = fsync_interval_s
+        self.pending_save_data = deque()  # 用于存储待保存的数据
+
+        # 待保存帧的内存上限，超出部分写入追加式的 spool 文件
+        self.max_pending_bytes = max(1, int(max_pending_bytes))
+        self.max_batch_bytes = max(1, self.max_pending_bytes // 4)
+        self.pending_bytes = 0
+        self.spool_lock = threading.Lock()
+        self.spool_fp = None
+        self.spilled_total = 0
+        self.spilled_pending = 0
+        self.spill_failures = 0
+        self.spilled_recovered = 0
+
+        # 图片编码参数和并行写图线程池
+        self.image_extension, quality_flag = IMAGE_FORMATS[image_format]
+        self.image_params = [quality_flag, int(image_quality)]
+        self.image_pool = ThreadPoolExecutor(max_workers=max(1, image_writers), thread_name_prefix="image_writer")
+
+        # 图片按 日期/小时/区域 分目录保存，每批写完统一同步
+        self.sync_images = sync_images
+        self.shard_dirs = set()
+
+        # 写图统计
+        self.stats_lock = threading.Lock()
+        self.pending_writes = 0
+        self.images_written = 0
+        self.image_write_failures = 0
+        self.csv_write_failures = 0
+        self.index_write_failures = 0
+        self.write_latency = Histogram()
 
         # Create output directories if they don't exist
         os.makedirs(self.output_dir, exist_ok=True)
         os.makedirs(self.images_dir, exist_ok=True)
 
+        # 结果以追加方式写入CSV，Excel只在导出时生成
+        # 可重入锁：导出时在同一把锁内同步并读取CSV，避免读到写了一半的批次
+        self.csv_lock = threading.RLock()
+        self._open_csv()
+
+        # 结果索引，供分页查询和按区域统计
+        self.results_store = ResultsStore(self.db_file)
+
+        # 上次运行未写完的溢出帧重新排队保存
+        self._recover_spool()
+
         # 线程控制
         self.lock = threading.Lock()
         self.condition = threading.Condition(self.lock)
@@ -130,7 +221,7 @@ class SaveResults:
             event_data.timestamp_ms / 1000).strftime("%Y%m%d_%H%M%S_%f")
         region_name = event_data.region_name or "unknown_region"
         pc_filename = f"{region_name}_{timestamp_str}_pc.jpg"
-        pc_path = os.path.join(self.images_dir, pc_filename)
+        pc_path = os.path.join(self._shard_dir(event_data.timestamp_ms, region_name), pc_filename)
 
         cv2.imwrite(pc_path, image)
         print(f"Pointcloud top-view saved to: {pc_path}")
@@ -139,52 +230,435 @@ class SaveResults:
 
     def add_matched_result(self, image_data: ImageData, event_data: EventData):
         """
-        Add a matched result to the results list
+        Add a matched result to the save queue
 
         Args:
             image_data: The ImageData object from the match
             event_data: The EventData object from the match
-            match_score: Optional match score for the pair
         """
-        # 只缓存数据，不立即保存图片
-        self.results_data.append({
-            'image_data': image_data,
-            'event_data': event_data
-        })
-        print("Matched result added to cache")
+        self.save_results([{'image': image_data, 'event': event_data}])
+
+    def _shard_dir(self, timestamp_ms: int, region_name: str) -> str:
+        """
+        Get (and create once) the shard directory images/YYYYMMDD/HH/region of a timestamp
+
+        Args:
+            timestamp_ms: Timestamp of the image in ms
+            region_name: Region of the image
+
+        Returns:
+            The shard directory path
+        """
+        time_str = datetime.fromtimestamp(timestamp_ms / 1000).strftime("%Y%m%d/%H")
+        shard_dir = os.path.join(self.images_dir, *time_str.split("/"), region_name)
+        if shard_dir not in self.shard_dirs:
+            os.makedirs(shard_dir, exist_ok=True)
+            self.shard_dirs.add(shard_dir)
+        return shard_dir
 
     def _save_image(self, image_data: ImageData) -> str:
         """
-        Save the image from ImageData to a file
+        Save the image from ImageData to a file in its shard directory and, with sync_images,
+        fsync it on the writer thread; the manifest and directory are synced in _sync_batch
 
         Args:
             image_data: The ImageData object containing the image
 
         Returns:
             The filename of the saved image
+
+        Raises:
+            IOError: If OpenCV could not encode or write the image, or it could not be synced
         """
         # Generate a unique filename based on timestamp and region
         timestamp_str = datetime.fromtimestamp(
             image_data.timestamp_ms / 1000).strftime("%Y%m%d_%H%M%S_%f")
         region_name = image_data.region_name or "unknown_region"
-        image_filename = f"{region_name}_{timestamp_str}.jpg"
-        image_path = os.path.join(self.images_dir, image_filename)
+        image_filename = f"{region_name}_{timestamp_str}{self.image_extension}"
+        shard_dir = self._shard_dir(image_data.timestamp_ms, region_name)
+        image_path = os.path.join(shard_dir, image_filename)
 
         # Save the image using OpenCV
-        cv2.imwrite(image_path, image_data.image)
-
+        start = time.perf_counter()
+        written = False
+        try:
+            written = cv2.imwrite(image_path, image_data.image, self.image_params)
+            if not written:
+                # 分片目录可能已被删除（如清理旧图片），去掉缓存并重建目录后重试一次
+                self.shard_dirs.discard(shard_dir)
+                os.makedirs(shard_dir, exist_ok=True)
+                self.shard_dirs.add(shard_dir)
+                written = cv2.imwrite(image_path, image_data.image, self.image_params)
+            if written and self.sync_images:
+                # 在写图线程上逐个同步，保存线程只需同步清单和目录
+                try:
+                    self._fsync_path(image_path)
+                except OSError:
+                    written = False
+                    raise
+        finally:
+            latency_ms = (time.perf_counter() - start) * 1000
+            with self.stats_lock:
+                self.pending_writes -= 1
+                if written:
+                    self.images_written += 1
+                else:
+                    self.image_write_failures += 1
+                self.write_latency.observe(latency_ms)
+
+        if not written:
+            raise IOError(f"cv2.imwrite failed for {image_path}")
         return image_path
 
-    def save_to_excel(self):
+    def _submit_image(self, image_data: Optional[ImageData]):
         """
-        Save all accumulated results to Excel file
+        Queue an image on the writer pool
+
+        Args:
+            image_data: The ImageData object containing the image, or None
+
+        Returns:
+            A Future resolving to the image path, or None if there is no image
         """
-        if not self.results_data:
-            print("No results to save to Excel")
-            return
+        if image_data is None or image_data.image is None:
+            return None
+        with self.stats_lock:
+            self.pending_writes += 1
+        try:
+            return self.image_pool.submit(self._save_image, image_data)
+        except RuntimeError as e:
+            # 线程池已关闭，在当前线程写图，不丢弃图片
+            print(f"Image writer pool unavailable, saving in place: {e}")
+            future = Future()
+            try:
+                future.set_result(self._save_image(image_data))
+            except Exception as save_error:
+                future.set_exception(save_error)
+            return future
+
+    @staticmethod
+    def _fsync_path(path: str):
+        """
+        Fsync a file or directory by path
+        """
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _sync_batch(self, saved: List[Tuple[str, ImageData]]):
+        """
+        Append the images of a batch to their shard manifests, then fsync each shard once:
+        one manifest write and one directory fsync per shard
 
-        # Create a DataFrame from the results data
-        df = pd.DataFrame(self.results_data)
+        The images themselves were already fsynced by the writer threads (see _save_image),
+        and images that failed to sync never reach this list, so a manifest never lists an
+        image that is not on disk.
+
+        Args:
+            saved: (image path, ImageData) of the images written in the batch
+        """
+        shards: Dict[str, List[Tuple[str, ImageData]]] = {}
+        for image_path, image_data in saved:
+            shards.setdefault(os.path.dirname(image_path), []).append((image_path, image_data))
+
+        for shard_dir, images in shards.items():
+            lines = [json.dumps({
+                'file': os.path.basename(image_path),
+                'timestamp_ms': image_data.timestamp_ms,
+                'timestamp_ms_local': image_data.timestamp_ms_local,
+                'region_name': image_data.region_name
+            }) + "\n" for image_path, image_data in images]
+            try:
+                with open(os.path.join(shard_dir, MANIFEST_FILENAME), 'a', encoding='utf-8') as f:
+                    f.write("".join(lines))
+                    if self.sync_images:
+                        f.flush()
+                        os.fsync(f.fileno())
+                if not self.sync_images:
+                    continue
+                # 目录项（新图片和清单文件）最后落盘
+                self._fsync_path(shard_dir)
+            except OSError as e:
+                print(f"Failed to sync shard {shard_dir}: {e}")
+
+    @staticmethod
+    def _frame_bytes(image_data: Optional[ImageData]) -> int:
+        """
+        Memory held by the frame of an ImageData, 0 if there is none
+        """
+        if image_data is None or image_data.image is None:
+            return 0
+        return int(image_data.image.nbytes)
+
+    def _spill(self, item: dict) -> dict:
+        """
+        Append the frame of a pending item to the spool file
+
+        Each record carries its result data along with the frame, so the frames that were
+        not saved before a crash can be recovered on the next start.
+
+        Args:
+            item: Pending item with an in-memory frame
+
+        Returns:
+            The item with the frame replaced by its spool location, or the item unchanged
+            if the spool write failed (it then stays in memory rather than being dropped)
+        """
+        image_data = item['image_data']
+        image = np.ascontiguousarray(image_data.image)
+        stripped = dataclasses.replace(image_data, image=None)
+        try:
+            meta = pickle.dumps((stripped, item['event_data'], image.shape, image.dtype.str))
+            with self.spool_lock:
+                self._open_spool()
+                offset = self.spool_fp.seek(0, os.SEEK_END)
+                self.spool_fp.write(SPOOL_HEADER.pack(0, len(meta), image.nbytes))
+                self.spool_fp.write(meta)
+                self.spool_fp.write(image.tobytes())
+                self.spool_fp.flush()
+                self.spilled_total += 1
+                self.spilled_pending += 1
+        except (OSError, pickle.PicklingError, TypeError, AttributeError) as e:
+            self.spill_failures += 1
+            print(f"Failed to spill frame, keeping it in memory: {e}")
+            return item
+
+        return {
+            'image_data': stripped,
+            'event_data': item['event_data'],
+            'spool': self._spool_ref(offset, len(meta), image.nbytes, image.shape, image.dtype.str)
+        }
+
+    @staticmethod
+    def _spool_ref(offset: int, meta_length: int, length: int, shape: tuple, dtype: str) -> dict:
+        """
+        Location of a spilled frame in the spool file
+
+        Args:
+            offset: Offset of the record header
+            meta_length: Length of the pickled result data
+            length: Length of the frame
+            shape: Frame shape
+            dtype: Frame dtype string
+
+        Returns:
+            The spool reference stored in the pending item
+        """
+        return {
+            'offset': offset,
+            'data_offset': offset + SPOOL_HEADER.size + meta_length,
+            'nbytes': length,
+            'shape': tuple(shape),
+            'dtype': dtype
+        }
+
+    def _open_spool(self):
+        """
+        Open the spool file for reading and writing without truncating it; call with self.spool_lock held
+        """
+        if self.spool_fp is None:
+            # 'a' 模式下 pwrite 也会写到文件末尾，这里用 r+b 保留已有内容
+            mode = 'r+b' if os.path.exists(self.spool_file) else 'w+b'
+            self.spool_fp = open(self.spool_file, mode)
+
+    def _mark_drained(self, items: List[dict]):
+        """
+        Mark spilled records as drained so they are not recovered again; call with self.spool_lock held
+
+        Args:
+            items: Pending items with a spool location
+        """
+        for item in items:
+            os.pwrite(self.spool_fp.fileno(), b'\x01', item['spool']['offset'])
+            self.spilled_pending -= 1
+        if self.spilled_pending == 0:
+            self.spool_fp.truncate(0)
+
+    def _recover_spool(self) -> int:
+        """
+        Queue the frames left in the spool file by a previous run that did not drain it
+
+        Records already drained are skipped; a partial record at the end (a write cut short
+        by the crash) is truncated away.
+
+        Returns:
+            The number of frames recovered
+        """
+        if not os.path.exists(self.spool_file):
+            return 0
+
+        recovered = []
+        with self.spool_lock:
+            self._open_spool()
+            fd = self.spool_fp.fileno()
+            size = os.fstat(fd).st_size
+            offset = 0
+            while offset + SPOOL_HEADER.size <= size:
+                drained, meta_length, length = SPOOL_HEADER.unpack(os.pread(fd, SPOOL_HEADER.size, offset))
+                end = offset + SPOOL_HEADER.size + meta_length + length
+                if end > size:
+                    break
+                if not drained:
+                    try:
+                        meta = os.pread(fd, meta_length, offset + SPOOL_HEADER.size)
+                        image_data, event_data, shape, dtype = pickle.loads(meta)
+                    except Exception as e:
+                        # 元数据损坏，无法恢复这条结果
+                        print(f"Failed to recover spilled frame at offset {offset}: {e}")
+                        os.pwrite(fd, b'\x01', offset)
+                    else:
+                        recovered.append({
+                            'image_data': image_data,
+                            'event_data': event_data,
+                            'spool': self._spool_ref(offset, meta_length, length, shape, dtype)
+                        })
+                offset = end
+
+            if not recovered:
+                self.spool_fp.truncate(0)
+            elif offset < size:
+                self.spool_fp.truncate(offset)
+            self.spilled_pending += len(recovered)
+            self.spilled_recovered = len(recovered)
+
+        if recovered:
+            self.pending_save_data.extend(recovered)
+            print(f"Recovered {len(recovered)} unsaved frames from {self.spool_file}")
+        return len(recovered)
+
+    def _load_spilled(self, item: dict) -> dict:
+        """
+        Read a spilled frame back from the spool file; its record stays in the spool until
+        the result is written (see _mark_drained)
+
+        Args:
+            item: Pending item with a spool location
+
+        Returns:
+            The item with its frame in memory
+        """
+        ref = item['spool']
+        with self.spool_lock:
+            data = os.pread(self.spool_fp.fileno(), ref['nbytes'], ref['data_offset'])
+        image = np.frombuffer(data, dtype=np.dtype(ref['dtype'])).reshape(ref['shape'])
+        return {
+            'image_data': dataclasses.replace(item['image_data'], image=image),
+            'event_data': item['event_data']
+        }
+
+    def _take_batch(self) -> Tuple[List[dict], int]:
+        """
+        Pop pending items up to max_batch_bytes of frames (at least one item); call with self.lock held
+
+        Returns:
+            The items, and the in-memory frame bytes among them
+        """
+        batch, batch_bytes, memory_bytes = [], 0, 0
+        while self.pending_save_data and (not batch or batch_bytes < self.max_batch_bytes):
+            item = self.pending_save_data.popleft()
+            if 'spool' in item:
+                batch_bytes += item['spool']['nbytes']
+            else:
+                size = self._frame_bytes(item['image_data'])
+                batch_bytes += size
+                memory_bytes += size
+            batch.append(item)
+        return batch, memory_bytes
+
+    def get_stats(self) -> dict:
+        """
+        Get the save statistics
+
+        Returns:
+            Pending results, frame bytes and spilled frames, pending image writes,
+            images written, failed image writes, result rows that failed to reach the CSV
+            or the SQLite index, and the write latency (ms)
+        """
+        with self.stats_lock:
+            return {
+                'pending_results': len(self.pending_save_data),
+                'pending_bytes': self.pending_bytes,
+                'max_pending_bytes': self.max_pending_bytes,
+                'spilled_total': self.spilled_total,
+                'spilled_pending': self.spilled_pending,
+                'spill_failures': self.spill_failures,
+                'spilled_recovered': self.spilled_recovered,
+                'pending_writes': self.pending_writes,
+                'images_written': self.images_written,
+                'image_write_failures': self.image_write_failures,
+                'csv_write_failures': self.csv_write_failures,
+                'index_write_failures': self.index_write_failures,
+                'write_latency_ms': self.write_latency.snapshot()
+            }
+
+    def _open_csv(self):
+        """
+        Open the results CSV for appending, writing the header if the file is new
+        """
+        is_new = not os.path.exists(self.csv_file) or os.path.getsize(self.csv_file) == 0
+        self.csv_fp = open(self.csv_file, 'a', newline='', encoding='utf-8')
+        self.csv_writer = csv.DictWriter(self.csv_fp, fieldnames=RESULT_COLUMNS)
+        if is_new:
+            self.csv_writer.writeheader()
+            self.csv_fp.flush()
+        self.last_fsync = time.monotonic()
+
+    def _append_rows(self, rows: List[dict]):
+        """
+        Append result rows to the CSV; the file is fsynced at most every fsync_interval_s
+
+        Args:
+            rows: Result rows with the RESULT_COLUMNS keys
+        """
+        with self.csv_lock:
+            self.csv_writer.writerows(rows)
+            self.csv_fp.flush()
+            if time.monotonic() - self.last_fsync >= self.fsync_interval_s:
+                os.fsync(self.csv_fp.fileno())
+                self.last_fsync = time.monotonic()
+
+    @staticmethod
+    def _csv_row(record: dict) -> dict:
+        """
+        Format a result record as a CSV row; missing timestamps are written as 'No Data'
+        """
+        row = dict(record)
+        for key in ('image_timestamp_ms', 'image_timestamp_ms_local', 'event_timestamp_ms', 'event_timestamp_ms_local'):
+            row[key] = str(record[key]) if record[key] is not None else 'No Data'
+        return row
+
+    def _sync_csv(self):
+        """
+        Flush and fsync the results CSV
+        """
+        with self.csv_lock:
+            if self.csv_fp.closed:
+                return
+            self.csv_fp.flush()
+            os.fsync(self.csv_fp.fileno())
+            self.last_fsync = time.monotonic()
+
+    def save_to_excel(self) -> Optional[str]:
+        """
+        Export all results in the CSV to the Excel file
+
+        Returns:
+            The Excel file path, or None if there are no results
+
+        Raises:
+            ValueError: If the results don't fit in one Excel sheet
+        """
+        with self.csv_lock:
+            self._sync_csv()
+            df = pd.read_csv(self.csv_file, dtype=str, keep_default_na=False)
+        if df.empty:
+            print("No results to save to Excel")
+            return None
+        if len(df) > EXCEL_MAX_ROWS - 1:
+            raise ValueError(f"{len(df)} results exceed the Excel limit of {EXCEL_MAX_ROWS - 1} rows, "
+                             f"use {self.csv_file} or the results API instead")
 
         # Save to Excel file with hyperlinks
         with pd.ExcelWriter(self.excel_file, engine='openpyxl') as writer:
@@ -230,7 +704,8 @@ class SaveResults:
 
         print(f"Results saved to Excel: {self.excel_file}")
         print(f"Images saved to: {self.images_dir}")
-        print(f"Total matched results saved: {len(self.results_data)}")
+        print(f"Total matched results saved: {len(df)}")
+        return self.excel_file
 
     def _save_worker(self):
         """
@@ -238,64 +713,131 @@ class SaveResults:
         """
         print("Save worker thread started")
 
-        while self.is_running:
+        while True:
 
             with self.condition:
                 # 等待直到有数据需要保存或线程停止
                 while not self.pending_save_data and self.is_running:
                     self.condition.wait(timeout=1.0)  # 1秒超时，定期检查线程状态
 
-                if not self.is_running:
+                # 停止时先保存完剩余数据再退出
+                if not self.pending_save_data:
                     break
 
-                # 复制待保存的数据，释放锁以便继续缓存新数据
-                save_data = self.pending_save_data.copy()
-                self.pending_save_data.clear()
+                # 按字节数取出一批数据，释放锁以便继续缓存新数据
+                save_data, memory_bytes = self._take_batch()
 
             if not save_data:
                 continue
 
-            print(f"Processing {len(save_data)} results for saving")
-
-            # 准备保存到Excel的数据
-            excel_data = []
-
-            # 保存图片并准备Excel数据
-            for item in save_data:
-                image_data = item['image_data']
-                event_data = item['event_data']
-
-                # 保存图片
-                image_path = self._save_image(
-                    image_data) if image_data is not None else None
-                # image_path = None
-                # 保存点云
-                # pointcloud_path = self._save_pointcloud(event_data) if event_data is not None else None
-                pointcloud_path = None
+            try:
+                self._process_batch(save_data)
+            except Exception as e:
+                # 任何异常都不能让工作线程退出，否则之后的结果都不会再保存
+                print(f"Failed to save batch of {len(save_data)} results: {e}")
+            finally:
+                # 这一批帧已处理完，释放其内存额度
+                with self.lock:
+                    self.pending_bytes -= memory_bytes
 
-                print(f"Image saved to: {image_path}")
-
-                # 准备Excel数据
-                excel_data.append({
-                    'image_timestamp_ms': str(image_data.timestamp_ms) if image_data is not None else 'No Data',
-                    'image_timestamp_ms_local': str(image_data.timestamp_ms_local) if image_data is not None else 'No Data',
-                    'event_timestamp_ms': str(event_data.timestamp_ms) if event_data is not None else 'No Data',
-                    'event_timestamp_ms_local': str(event_data.timestamp_ms_local) if event_data is not None else 'No Data',
-                    'region_name': image_data.region_name if image_data is not None else event_data.region_name,
-                    'image_filename': image_path,
-                    'pointcloud_filename': pointcloud_path
-                })
+            print("Save worker completed processing current batch")
 
-            # 将新的Excel数据添加到已有的结果数据中
-            with self.lock:
-                self.results_data.extend(excel_data)
+        print("Save worker thread stopped")
 
-            # 执行Excel保存
-            self.save_to_excel()
+    def _process_batch(self, save_data: List[dict]) -> bool:
+        """
+        处理一批待保存数据：写图片、同步、追加CSV并写入结果索引
 
-            print("Save worker completed processing current batch")
+        Args:
+            save_data: 从待保存队列取出的一批数据
 
-        print("Save worker thread stopped")
+        Returns:
+            结果行是否已写入CSV和结果索引
+        """
+        print(f"Processing {len(save_data)} results for saving")
+
+        # 溢出到 spool 文件的帧读回内存；结果写入CSV和索引之后才标记为已取出，
+        # 中途崩溃时下次启动仍能从 spool 文件恢复
+        spilled = [item for item in save_data if 'spool' in item]
+        for index, item in enumerate(save_data):
+            if 'spool' in item:
+                try:
+                    save_data[index] = self._load_spilled(item)
+                except OSError as e:
+                    # 结果行照常写入，只是没有图片
+                    print(f"Failed to read spilled frame: {e}")
+                    save_data[index] = {'image_data': item['image_data'], 'event_data': item['event_data']}
+
+        # 准备结果行
+        records = []
+
+        # 图片交给写图线程池并行编码保存
+        image_futures = []
+        for item in save_data:
+            try:
+                image_futures.append(self._submit_image(item['image_data']))
+            except Exception as e:
+                print(f"Failed to queue image: {e}")
+                image_futures.append(None)
+
+        # 等待图片保存并准备结果行
+        saved_images = []
+        for item, image_future in zip(save_data, image_futures):
+            image_data = item['image_data']
+            event_data = item['event_data']
+
+            # 保存图片
+            image_path = None
+            if image_future is not None:
+                try:
+                    image_path = image_future.result()
+                    saved_images.append((image_path, image_data))
+                except Exception as e:
+                    print(f"Failed to save image: {e}")
+            # image_path = None
+            # 保存点云
+            # pointcloud_path = self._save_pointcloud(event_data) if event_data is not None else None
+            pointcloud_path = None
+
+            print(f"Image saved to: {image_path}")
+
+            # 准备结果行
+            records.append({
+                'image_timestamp_ms': image_data.timestamp_ms if image_data is not None else None,
+                'image_timestamp_ms_local': image_data.timestamp_ms_local if image_data is not None else None,
+                'event_timestamp_ms': event_data.timestamp_ms if event_data is not None else None,
+                'event_timestamp_ms_local': event_data.timestamp_ms_local if event_data is not None else None,
+                'region_name': image_data.region_name if image_data is not None else event_data.region_name,
+                'image_filename': image_path,
+                'pointcloud_filename': pointcloud_path
+            })
+
+        # 整批图片写完后统一写清单并同步
+        self._sync_batch(saved_images)
+
+        # 追加到CSV（Excel在导出时统一生成），并写入结果索引；写失败只计数，不让工作线程退出
+        written = True
+        try:
+            self._append_rows([self._csv_row(record) for record in records])
+        except Exception as e:
+            written = False
+            with self.stats_lock:
+                self.csv_write_failures += len(records)
+            print(f"Failed to append results to CSV: {e}")
+        try:
+            self.results_store.insert(records)
+        except Exception as e:
+            written = False
+            with self.stats_lock:
+                self.index_write_failures += len(records)
+            print(f"Failed to index results: {e}")
+        if written and spilled:
+            try:
+                with self.spool_lock:
+                    self._mark_drained(spilled)
+            except OSError as e:
+                print(f"Failed to mark spilled frames as saved: {e}")
+        return written
 
     def save_results(self, results: List[Tuple[ImageData, EventData]]):
         """
@@ -305,12 +847,18 @@ class SaveResults:
             results: List of tuples containing (ImageData, EventData, match_score)
         """
         with self.condition:
-            # 将结果添加到待保存队列
+            # 将结果添加到待保存队列，帧的总字节数超过上限时溢出到 spool 文件
             for result in results:
-                self.pending_save_data.append({
+                item = {
                     'image_data': result['image'],
                     'event_data': result['event']
-                })
+                }
+                size = self._frame_bytes(item['image_data'])
+                if size and self.pending_bytes + size > self.max_pending_bytes:
+                    item = self._spill(item)
+                if 'spool' not in item:
+                    self.pending_bytes += size
+                self.pending_save_data.append(item)
 
             # 通知工作线程有新数据需要处理
             self.condition.notify()
@@ -319,24 +867,55 @@ class SaveResults:
 
     def clear_results(self):
         """
-        Clear the accumulated results data
+        Clear the results waiting to be saved
         """
         with self.lock:
-            self.results_data = []
-            self.pending_save_data = []
+            spilled = []
+            for item in self.pending_save_data:
+                if 'spool' in item:
+                    spilled.append(item)
+                else:
+                    self.pending_bytes -= self._frame_bytes(item['image_data'])
+            self.pending_save_data = deque()
+            if spilled:
+                with self.spool_lock:
+                    self._mark_drained(spilled)
         print("Results data cleared")
 
-    def stop(self):
+    def stop(self, export_excel: bool = True):
         """
-        停止保存线程
+        停止保存线程，写完剩余数据后关闭CSV，并按需导出Excel
+
+        Args:
+            export_excel: Whether to export the Excel file after the last batch
         """
         with self.condition:
             self.is_running = False
             self.condition.notify()
 
-        # 等待线程结束
+        # 等待线程写完全部剩余数据后再关闭写图线程池和文件，不设超时
         if self.save_thread and self.save_thread.is_alive():
-            self.save_thread.join(timeout=5.0)
+            self.save_thread.join()
+        self.image_pool.shutdown(wait=True)
+
+        if self.csv_fp.closed:
+            return
+        # 导出失败（如超过Excel行数上限）不能跳过关闭CSV、数据库和 spool 文件
+        try:
+            self._sync_csv()
+            if export_excel:
+                self.save_to_excel()
+        except Exception as e:
+            print(f"Failed to export results on stop: {e}")
+        finally:
+            with self.csv_lock:
+                self.csv_fp.close()
+            self.results_store.close()
+            with self.spool_lock:
+                if self.spool_fp is not None:
+                    self.spool_fp.close()
+                    if self.spilled_pending == 0:
+                        os.remove(self.spool_file)
 
         print("SaveResults stopped")
 
@@ -387,6 +966,6 @@ if __name__ == "__main__":
 
     # Add and save the test result
     save_results.add_matched_result(test_image_data, test_event_data)
-    save_results.save_to_excel()
+    save_results.stop()
 
     print("Test completed successfully")
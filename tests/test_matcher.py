@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests of the sensor clock offset estimation of Matcher.
+
+The streams are simulated on synthetic clocks: vehicles pass at random intervals,
+events arrive almost immediately, images after an inference delay, and each stream
+misses some of the vehicles.
+"""
+
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.modules.camera_modules import ImageData
+from backend.modules.simpl_modules import EventData
+from matcher import Matcher
+
+CAMERA_OFFSET_MS = 100000
+
+
+def simulate(matcher: Matcher, seed: int, vehicles: int = 400, rate_per_s: float = 2.0, drop: float = 0.15,
+             inference_ms: float = 300, camera_offset_ms: float = CAMERA_OFFSET_MS, start_ms: float = 0):
+    """
+    Feed simulated events and images to the matcher in arrival order.
+
+    Returns:
+        All pairs returned by the matcher, and the end of the simulated time
+    """
+    rng = random.Random(seed)
+    arrivals = []
+    t = start_ms
+    for vehicle in range(vehicles):
+        t += rng.expovariate(rate_per_s / 1000.0)
+        if rng.random() >= drop:
+            local = t + rng.uniform(5, 30)
+            arrivals.append((local, EventData(timestamp_ms=int(t + rng.gauss(0, 3)),
+                                              timestamp_ms_local=int(local), region_name="lane1",
+                                              region_id=0, box=None)))
+        if rng.random() >= drop:
+            local = t + inference_ms + rng.uniform(-60, 60)
+            arrivals.append((local, ImageData(timestamp_ms=int(t + camera_offset_ms + rng.gauss(0, 5)),
+                                              timestamp_ms_local=int(local), image=None, width=0, height=0,
+                                              channels=0, region_name="lane1")))
+    arrivals.sort(key=lambda arrival: arrival[0])
+
+    pairs = []
+    for _, data in arrivals:
+        if isinstance(data, EventData):
+            pairs.extend(matcher.add_event_data(data))
+        else:
+            pairs.extend(matcher.add_image_data(data))
+    return pairs, t
+
+
+def correct_fraction(pairs, camera_offset_ms: float = CAMERA_OFFSET_MS) -> float:
+    """Fraction of the matched pairs that pair an event with the image of the same vehicle."""
+    matched = [p for p in pairs if p["event"] is not None and p["image"] is not None]
+    correct = [p for p in matched
+               if abs(p["image"].timestamp_ms - camera_offset_ms - p["event"].timestamp_ms) < 40]
+    return len(correct) / max(1, len(matched))
+
+
+@pytest.mark.parametrize("match_mode", ["first", "nearest"])
+@pytest.mark.parametrize("seed", range(5))
+def test_offset_with_latency_and_dropped_items(match_mode, seed):
+    matcher = Matcher(max_time_diff_ms=2000, use_local_timestamp=False, match_mode=match_mode,
+                      lookahead_ms=200, sweep_interval_ms=0, sensor_time_diff_ms=100)
+    pairs, _ = simulate(matcher, seed)
+
+    assert matcher.sensor_clock_ready
+    assert abs(matcher.clock_offset_ms - CAMERA_OFFSET_MS) < 20
+    assert matcher.clock_fallbacks == 0
+    # Pairs matched on the sensor clock, after the offset is known
+    sensor_pairs = pairs[len(pairs) // 2:]
+    # First mode takes the oldest image inside the window, a close neighbour now and then
+    assert correct_fraction(sensor_pairs) > (0.95 if match_mode == "nearest" else 0.9)
+
+
+def test_periodic_traffic_stays_on_local_clock():
+    # Evenly spaced vehicles make every neighbour an equally good candidate: no peak stands out
+    matcher = Matcher(max_time_diff_ms=2000, use_local_timestamp=False, sweep_interval_ms=0)
+    for k in range(300):
+        t = k * 500.0
+        matcher.add_event_data(EventData(timestamp_ms=int(t), timestamp_ms_local=int(t), region_name="lane1",
+                                         region_id=0, box=None))
+        matcher.add_image_data(ImageData(timestamp_ms=int(t + CAMERA_OFFSET_MS), timestamp_ms_local=int(t + 300),
+                                         image=None, width=0, height=0, channels=0, region_name="lane1"))
+    assert not matcher.sensor_clock_ready
+
+
+def test_falls_back_after_camera_clock_jump():
+    matcher = Matcher(max_time_diff_ms=2000, use_local_timestamp=False, sweep_interval_ms=0,
+                      sensor_time_diff_ms=100)
+    _, end_ms = simulate(matcher, seed=0)
+    assert matcher.sensor_clock_ready
+
+    # The camera clock jumps by a second: sensor matches fail, matching falls back, then re-converges
+    jumped = CAMERA_OFFSET_MS + 1000
+    pairs, _ = simulate(matcher, seed=1, camera_offset_ms=jumped, start_ms=end_ms + 5000)
+    assert matcher.clock_fallbacks >= 1
+    assert matcher.sensor_clock_ready
+    assert abs(matcher.clock_offset_ms - jumped) < 20
+    assert correct_fraction(pairs[len(pairs) // 2:], jumped) > 0.9
+    assert np.isfinite(matcher.pipeline_delay_ms)
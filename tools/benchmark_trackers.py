@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compare BoT-SORT, ByteTrack and the built-in IouTracker on a recorded clip.
+
+Reports per-frame time and an ID-switch rate. Without ground truth, an ID switch
+is counted when a new track ID appears on a box overlapping (IoU >= 0.5) the last
+box of a track that disappeared within the previous `--switch-gap` frames.
+
+Usage (from the repository root):
+    python tools/benchmark_trackers.py --video clip.mp4
+    python tools/benchmark_trackers.py --record clip.record --camera-channel /camera/frame
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Dict, Iterator, List
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from iou_tracker import iou_matrix  # noqa: E402
+from tracker import TRACKER_CONFIGS, Tracker  # noqa: E402
+
+
+def arg_parse():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--video", type=str, help="video file readable by OpenCV")
+    parser.add_argument("--record", type=str, help="cyber record file with CameraFrame messages")
+    parser.add_argument("--camera-channel", type=str, default=None, help="camera channel in the record")
+    parser.add_argument("--model", type=str, default="models/yolo11s.pt")
+    parser.add_argument("--classes", type=str, default="car,truck,bus")
+    parser.add_argument("--max-frames", type=int, default=0, help="0 reads the whole clip")
+    parser.add_argument("--switch-gap", type=int, default=5)
+    parser.add_argument("--trackers", type=str, default=",".join(TRACKER_CONFIGS))
+    args = parser.parse_args()
+    if not args.video and not args.record:
+        parser.error("either --video or --record is required")
+    return args
+
+
+def read_video(path: str) -> Iterator[np.ndarray]:
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Failed to open video: {path}")
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        yield frame
+    cap.release()
+
+
+def read_record(path: str, camera_channel: str = None) -> Iterator[np.ndarray]:
+    from cyber_record.record import Record
+    from backend.scripts.simpl_data_process import handle_camera
+    record = Record(path)
+    channels = [camera_channel] if camera_channel else None
+    for _, message, _ in record.read_messages(channels):
+        if message.DESCRIPTOR.full_name != "omnividi.camera.CameraFrame":
+            continue
+        image_data = handle_camera(message)
+        if image_data.image is not None:
+            yield image_data.image
+
+
+def load_frames(args) -> List[np.ndarray]:
+    frames = read_video(args.video) if args.video else read_record(args.record, args.camera_channel)
+    out = []
+    for frame in frames:
+        out.append(frame)
+        if args.max_frames and len(out) >= args.max_frames:
+            break
+    return out
+
+
+def count_id_switches(per_frame: List[List[Dict]], gap: int) -> Dict[str, int]:
+    """Count new track IDs that take over the box of a recently lost track."""
+    last_seen: Dict[int, tuple] = {}  # track_id -> (frame index, box)
+    seen_ids = set()
+    switches = 0
+    for frame_idx, results in enumerate(per_frame):
+        current_ids = {r['track_id'] for r in results}
+        lost = [(tid, box) for tid, (idx, box) in last_seen.items()
+                if tid not in current_ids and 0 < frame_idx - idx <= gap]
+        new = [r for r in results if r['track_id'] not in seen_ids]
+        if lost and new:
+            ious = iou_matrix(np.array([r['box'] for r in new]), np.array([box for _, box in lost]))
+            switches += int(np.count_nonzero(ious.max(axis=1) >= 0.5))
+        for r in results:
+            seen_ids.add(r['track_id'])
+            last_seen[r['track_id']] = (frame_idx, r['box'])
+    return {'unique_ids': len(seen_ids), 'id_switches': switches}
+
+
+def benchmark(tracker_type: str, frames: List[np.ndarray], args) -> Dict[str, float]:
+    tracker = Tracker(onnx_model_path=args.model, tracker_type=tracker_type,
+                      class_names=[c for c in args.classes.split(",") if c])
+
+    timings = []
+    per_frame = []
+    for frame in frames:
+        start = time.perf_counter()
+        per_frame.append(tracker.detect_and_track(frame))
+        timings.append((time.perf_counter() - start) * 1000)
+
+    stats = count_id_switches(per_frame, args.switch_gap)
+    boxes = sum(len(r) for r in per_frame)
+    timings = np.array(timings[1:] or timings)  # the first frame includes model warm-up
+    return {
+        'tracker': tracker_type,
+        'mean_ms': float(timings.mean()),
+        'p95_ms': float(np.percentile(timings, 95)),
+        'unique_ids': stats['unique_ids'],
+        'id_switches': stats['id_switches'],
+        'switch_rate': stats['id_switches'] / boxes if boxes else 0.0,
+    }
+
+
+def main():
+    args = arg_parse()
+    frames = load_frames(args)
+    if not frames:
+        print("No frames read")
+        return
+    print(f"Loaded {len(frames)} frames")
+
+    rows = [benchmark(t.strip(), frames, args) for t in args.trackers.split(",") if t.strip()]
+    print(f"{'tracker':<10} {'mean ms':>9} {'p95 ms':>9} {'ids':>6} {'switches':>9} {'switch/box':>11}")
+    for row in rows:
+        print(f"{row['tracker']:<10} {row['mean_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['unique_ids']:>6} "
+              f"{row['id_switches']:>9} {row['switch_rate']:>11.4f}")
+
+
+if __name__ == "__main__":
+    main()
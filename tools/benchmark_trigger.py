@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark Trigger over synthetic lane/trigger configs and box streams.
+
+For every point of the grid (lane count x trigger segments x boxes per frame) a
+lane_trigger_data.json-style config is generated with side-by-side perspective
+lanes and polyline trigger lines crossing all of them. Vehicles move down the
+lanes at random speeds and respawn at the top, so track IDs persist across frames
+like they do behind a real tracker.
+
+Reports per-frame time of process_boxes and per-box time of _locate_lane and
+_trigger_hits.
+
+Usage (from the repository root):
+    python tools/benchmark_trigger.py
+    python tools/benchmark_trigger.py --lanes 2,8,32 --segments 1,16 --boxes 10,100 --mode crossing
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trigger import Trigger  # noqa: E402
+
+
+def arg_parse():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lanes", type=str, default="2,4,8,16", help="lane counts")
+    parser.add_argument("--segments", type=str, default="1,4,16", help="segments per trigger line")
+    parser.add_argument("--boxes", type=str, default="5,20,50", help="boxes per frame")
+    parser.add_argument("--triggers", type=int, default=2, help="trigger lines per config")
+    parser.add_argument("--frames", type=int, default=500, help="frames per grid point")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--mode", type=str, default="distance", choices=Trigger.TRIGGER_MODES)
+    parser.add_argument("--detection-point", type=str, default="bottom_center",
+                        choices=["center", "top_center", "bottom_center"])
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def make_config(num_lanes: int, num_triggers: int, segments: int, width: int, height: int,
+                rng: np.random.Generator) -> Dict:
+    """Side-by-side lanes converging towards the top, and polyline triggers spanning all lanes."""
+    top_y, bottom_y = 0.15 * height, height - 1.0
+    top_x = np.linspace(0.35 * width, 0.65 * width, num_lanes + 1)
+    bottom_x = np.linspace(0.0, width - 1.0, num_lanes + 1)
+
+    lanes = []
+    for i in range(num_lanes):
+        points = [(bottom_x[i], bottom_y), (top_x[i], top_y), (top_x[i + 1], top_y), (bottom_x[i + 1], bottom_y)]
+        lanes.append({
+            "id": i + 1,
+            "number": i + 1,
+            "name": f"lane_{i + 1}",
+            "points": [{"x": float(x), "y": float(y)} for x, y in points],
+            "type": "lane"
+        })
+
+    triggers = []
+    for j in range(num_triggers):
+        y = top_y + (bottom_y - top_y) * (j + 1) / (num_triggers + 1)
+        xs = np.linspace(0.0, width - 1.0, segments + 1)
+        ys = y + rng.uniform(-0.02, 0.02, segments + 1) * height
+        triggers.append({
+            "id": j + 1,
+            "name": f"trigger_{j + 1}",
+            "points": [{"x": float(x), "y": float(v)} for x, v in zip(xs, ys)],
+            "type": "trigger"
+        })
+
+    return {"lanes": lanes, "triggers": triggers, "videoSize": {"width": width, "height": height}}
+
+
+def make_box_stream(num_boxes: int, num_frames: int, width: int, height: int,
+                    rng: np.random.Generator) -> List[List[Dict]]:
+    """Vehicles moving down the frame; a vehicle leaving the frame respawns at the top with a new track ID."""
+    sizes = rng.uniform(0.03, 0.1, (num_boxes, 2)) * [width, height]
+    xs = rng.uniform(0.0, width, num_boxes)
+    ys = rng.uniform(0.0, height, num_boxes)
+    speeds = rng.uniform(0.005, 0.03, num_boxes) * height
+    track_ids = np.arange(num_boxes)
+    next_id = num_boxes
+
+    frames = []
+    for _ in range(num_frames):
+        ys = ys + speeds
+        respawn = ys > height
+        count = int(np.count_nonzero(respawn))
+        if count:
+            ys[respawn] = 0.0
+            xs[respawn] = rng.uniform(0.0, width, count)
+            track_ids[respawn] = np.arange(next_id, next_id + count)
+            next_id += count
+        frames.append([{
+            'box': [float(x), float(y), float(x + w), float(y + h)],
+            'track_id': int(tid),
+            'class_id': 2,
+            'class_name': 'car'
+        } for x, y, (w, h), tid in zip(xs, ys, sizes, track_ids)])
+    return frames
+
+
+def benchmark(config_path: str, frames: List[List[Dict]], args) -> Dict[str, float]:
+    trigger = Trigger(lane_trigger_path=config_path, lane_detection_point=args.detection_point,
+                      trigger_mode=args.mode)
+    trigger.set_scale(args.width, args.height)
+
+    triggered = 0
+    start = time.perf_counter()
+    for boxes in frames:
+        triggered += len(trigger.process_boxes(boxes))
+    process_ms = (time.perf_counter() - start) * 1000
+
+    all_boxes = [b['box'] for boxes in frames for b in boxes]
+    start = time.perf_counter()
+    for box in all_boxes:
+        trigger._locate_lane(box)
+    locate_us = (time.perf_counter() - start) * 1e6 / max(1, len(all_boxes))
+
+    start = time.perf_counter()
+    for box in all_boxes:
+        trigger._trigger_hits(box)
+    hits_us = (time.perf_counter() - start) * 1e6 / max(1, len(all_boxes))
+
+    return {
+        'frame_ms': process_ms / len(frames),
+        'boxes_per_s': len(all_boxes) / (process_ms / 1000) if process_ms else 0.0,
+        'locate_us': locate_us,
+        'hits_us': hits_us,
+        'triggered': triggered,
+    }
+
+
+def parse_ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    args = arg_parse()
+    rng = np.random.default_rng(args.seed)
+
+    print(f"mode={args.mode} detection_point={args.detection_point} frames={args.frames} "
+          f"frame={args.width}x{args.height} triggers={args.triggers}")
+    print(f"{'lanes':>6} {'segs':>5} {'boxes':>6} {'frame ms':>9} {'boxes/s':>10} "
+          f"{'locate us':>10} {'hits us':>9} {'triggered':>10}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config_path = os.path.join(tmp_dir, "lane_trigger_data.json")
+        for num_lanes in parse_ints(args.lanes):
+            for segments in parse_ints(args.segments):
+                config = make_config(num_lanes, args.triggers, segments, args.width, args.height, rng)
+                with open(config_path, "w", encoding="utf-8") as f:
+                    json.dump(config, f)
+                for num_boxes in parse_ints(args.boxes):
+                    frames = make_box_stream(num_boxes, args.frames, args.width, args.height, rng)
+                    row = benchmark(config_path, frames, args)
+                    print(f"{num_lanes:>6} {segments:>5} {num_boxes:>6} {row['frame_ms']:>9.3f} "
+                          f"{row['boxes_per_s']:>10.0f} {row['locate_us']:>10.1f} {row['hits_us']:>9.1f} "
+                          f"{row['triggered']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TrackStateStore
+---------------
+按 track_id 保存跟踪目标的状态：最后出现的帧号和时间、各触发线的触发状态、所在车道、检测点历史。
+按最后出现时间排序，淘汰（超龄、超时或超出容量）总是从最久未出现的 track 开始，单次 O(1)。
+"""
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional, Set, Tuple
+
+
+@dataclass
+class TrackState:
+    """单个 track 的状态"""
+    track_id: Any
+    first_seen_frame: int
+    last_seen_frame: int
+    last_seen_ms: float
+    lane_name: Optional[str] = None
+    triggered_lines: Set[str] = field(default_factory=set)  # 已触发过的触发线名称
+    history: Deque[Tuple[float, float]] = field(default_factory=deque)  # 最近的检测点，最新的在末尾
+
+    @property
+    def triggered(self) -> bool:
+        """是否已经触发过任意触发线"""
+        return bool(self.triggered_lines)
+
+
+class TrackStateStore:
+    """
+    有界的 track 状态表。
+    - touch(): 新建或刷新 track，并移到队尾（最新）
+    - expire(): 从队首淘汰超过 ttl_frames 帧或 ttl_ms 毫秒未出现的 track，耗时与淘汰数量成正比
+    - 超出 max_tracks 时淘汰最久未出现的 track，而不是任意一个
+    """
+
+    def __init__(self,
+                 max_tracks: int = 1000,
+                 ttl_frames: Optional[int] = None,
+                 ttl_ms: Optional[float] = 120000.0,
+                 history_length: int = 2) -> None:
+        """
+        参数:
+            max_tracks: 最多保存的 track 数
+            ttl_frames: 超过多少帧未出现就淘汰，None 表示不按帧淘汰
+            ttl_ms: 超过多少毫秒未出现就淘汰，None 表示不按时间淘汰
+            history_length: 每个 track 保存的检测点个数
+        """
+        self.max_tracks = max_tracks
+        self.ttl_frames = ttl_frames
+        self.ttl_ms = ttl_ms
+        self.history_length = history_length
+        self._states: "OrderedDict[Any, TrackState]" = OrderedDict()
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def __contains__(self, track_id: Any) -> bool:
+        return track_id in self._states
+
+    def get(self, track_id: Any) -> Optional[TrackState]:
+        """获取 track 状态，不存在返回 None"""
+        return self._states.get(track_id)
+
+    def touch(self, track_id: Any, frame_index: int, now_ms: float) -> TrackState:
+        """新建或刷新 track 的最后出现帧号和时间"""
+        state = self._states.get(track_id)
+        if state is None:
+            state = TrackState(track_id=track_id,
+                               first_seen_frame=frame_index,
+                               last_seen_frame=frame_index,
+                               last_seen_ms=now_ms,
+                               history=deque(maxlen=self.history_length))
+            self._states[track_id] = state
+            while len(self._states) > self.max_tracks:
+                self._states.popitem(last=False)
+                self.evicted += 1
+        else:
+            state.last_seen_frame = frame_index
+            state.last_seen_ms = now_ms
+            self._states.move_to_end(track_id)
+        return state
+
+    def expire(self, frame_index: int, now_ms: float) -> int:
+        """
+        淘汰超龄/超时的 track
+
+        返回:
+            本次淘汰的 track 数
+        """
+        expired = 0
+        while self._states:
+            oldest = next(iter(self._states.values()))
+            too_old = self.ttl_frames is not None and frame_index - oldest.last_seen_frame > self.ttl_frames
+            timed_out = self.ttl_ms is not None and now_ms - oldest.last_seen_ms > self.ttl_ms
+            if not (too_old or timed_out):
+                break
+            self._states.popitem(last=False)
+            expired += 1
+        self.evicted += expired
+        return expired
+
+    def clear(self) -> None:
+        """清空所有 track 状态"""
+        self._states.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取状态表统计信息"""
+        return {'tracks': len(self._states), 'evicted': self.evicted}
@@ -1,7 +1,35 @@
 import cv2
 import numpy as np
-from typing import List, Dict, Tuple, Optional, Any
+from typing import List, Dict, Tuple, Optional, Any, Callable
 from ultralytics import YOLO
+from iou_tracker import IouTracker
+
+# Ultralytics tracker configs; "iou" uses the built-in IouTracker
+TRACKER_CONFIGS = {
+    'botsort': 'models/botsort.yaml',
+    'bytetrack': 'models/bytetrack.yaml',
+    'iou': None,
+}
+
+
+def resolve_class_ids(classes: Dict[int, str], class_names: Optional[List[str]]) -> Optional[List[int]]:
+    """
+    Map class names to model class ids.
+
+    Args:
+        classes (Dict[int, str]): Model class names keyed by class id.
+        class_names (Optional[List[str]]): Class whitelist, None or empty keeps every class.
+
+    Returns:
+        Optional[List[int]]: Class ids for the model's `classes=` argument, None for every class.
+    """
+    if not class_names:
+        return None
+    name_to_id = {name: class_id for class_id, name in classes.items()}
+    unknown = [name for name in class_names if name not in name_to_id]
+    if unknown:
+        raise ValueError(f"Unknown class names: {unknown}")
+    return [name_to_id[name] for name in class_names]
 
 
 class Tracker:
@@ -10,24 +38,56 @@ class Tracker:
     """
 
     def __init__(self,
-                 onnx_model_path: str):
+                 onnx_model_path: str,
+                 detect_interval: int = 1,
+                 velocity_smoothing: float = 0.5,
+                 class_names: Optional[List[str]] = None,
+                 confidence_threshold: float = 0.5,
+                 nms_threshold: float = 0.7,
+                 model: Optional[YOLO] = None,
+                 tracker_type: str = 'botsort'):
         """
         Initialize the Tracker with ObjectDetector and DeepSort.
 
         Args:
             onnx_model_path (str): Path to the ONNX model file.
+            detect_interval (int): Run full detection every N frames, boxes are
+                propagated with a constant-velocity model in between. 1 disables propagation.
+            velocity_smoothing (float): Weight of the previous velocity when a new
+                detection updates a track's velocity (0 uses the latest measurement only).
+            class_names (Optional[List[str]]): Class whitelist passed to the model, None keeps every class.
             classes_path (str): Path to the YAML file containing class names.
             confidence_threshold (float): Minimum confidence threshold for detections.
             nms_threshold (float): Threshold for Non-Maximum Suppression.
+            model (Optional[YOLO]): Already loaded model to share, e.g. from an InferenceServer.
+            tracker_type (str): One of TRACKER_CONFIGS: "botsort", "bytetrack" or "iou".
             max_age (int): Maximum number of frames to keep a track without updates.
             n_init (int): Number of consecutive detections needed to initialize a track.
             nn_budget (int): Maximum size of the appearance descriptor gallery.
             device (str): Device to use for inference ("cpu" or "cuda").
         """
+        if tracker_type not in TRACKER_CONFIGS:
+            raise ValueError(f"tracker_type must be one of {list(TRACKER_CONFIGS)}, got: {tracker_type}")
+        self.tracker_type = tracker_type
+        self.iou_tracker = IouTracker() if tracker_type == 'iou' else None
+
         self.track_colors = {}
-        self.model = YOLO(onnx_model_path, task='detect')
+        self.model = model if model is not None else YOLO(onnx_model_path, task='detect')
         self.classes = self.model.names
 
+        # Class whitelist and thresholds are applied inside the model call,
+        # so NMS and tracking only work on the classes we count
+        self.class_names = list(class_names) if class_names else None
+        self.class_ids = resolve_class_ids(self.classes, self.class_names)
+        self.confidence_threshold = confidence_threshold
+        self.nms_threshold = nms_threshold
+
+        # Detection cadence and constant-velocity state per track_id
+        self.detect_interval = max(1, int(detect_interval))
+        self.velocity_smoothing = velocity_smoothing
+        self._frames_since_detect = self.detect_interval  # first frame always runs detection
+        self._motion_states: Dict[int, Dict[str, Any]] = {}
+
     def detect_and_track(self, image: np.ndarray) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
         """
         Perform object detection and tracking on the input image.
@@ -40,8 +100,18 @@ class Tracker:
                 - List of detection results from ObjectDetector
                 - List of tracking results with track IDs
         """
+        tracking_results = self._run_tracker(image)
+        self._update_motion_states(tracking_results)
+        return tracking_results
+
+    def _run_tracker(self, image: np.ndarray) -> List[Dict[str, Any]]:
+        """Run the model and its tracker on one frame and convert the result to tracking dicts."""
+        if self.iou_tracker is not None:
+            return self._run_iou_tracker(image)
+
         result = self.model.track(
-            image, persist=True, verbose=False, tracker='models/botsort.yaml', conf=0.5)[0]
+            image, persist=True, verbose=False, tracker=TRACKER_CONFIGS[self.tracker_type],
+            classes=self.class_ids, conf=self.confidence_threshold, iou=self.nms_threshold)[0]
 
         tracking_results = []
         if result.boxes and result.boxes.is_track:
@@ -59,6 +129,101 @@ class Tracker:
 
         return tracking_results
 
+    def _run_iou_tracker(self, image: np.ndarray) -> List[Dict[str, Any]]:
+        """Run detection only and associate the boxes with the built-in IouTracker."""
+        result = self.model.predict(
+            image, verbose=False,
+            classes=self.class_ids, conf=self.confidence_threshold, iou=self.nms_threshold)[0]
+        boxes = result.boxes
+        tracks = self.iou_tracker.update(boxes.xyxy.cpu().numpy(),
+                                         boxes.cls.int().cpu().numpy(),
+                                         boxes.conf.cpu().numpy())
+        return [{
+            'track_id': int(track[4]),
+            'class_id': int(track[6]),
+            'class_name': self.classes[int(track[6])],
+            'box': track[:4].tolist()
+        } for track in tracks]
+
+    def track(self,
+              image: np.ndarray,
+              should_detect: Optional[Callable[[List[Dict[str, Any]]], bool]] = None) -> List[Dict[str, Any]]:
+        """
+        Track objects with the configured detection cadence.
+
+        Full detection runs every `detect_interval` frames. In between, the boxes of the
+        last detection are advanced with their constant velocity. `should_detect` receives
+        the predicted boxes and can request an early detection, e.g. when a track comes
+        close to a trigger line.
+
+        Args:
+            image (np.ndarray): Input image in BGR format.
+            should_detect (Optional[Callable]): Callback deciding whether the predicted boxes need a full detection.
+
+        Returns:
+            List[Dict[str, Any]]: Tracking results; propagated boxes carry `predicted=True`.
+        """
+        frames_ahead = self._frames_since_detect + 1
+        if self.detect_interval <= 1 or frames_ahead >= self.detect_interval:
+            return self.detect_and_track(image)
+
+        predicted = self.predict_tracks(frames_ahead)
+        if should_detect is not None and should_detect(predicted):
+            return self.detect_and_track(image)
+
+        self._frames_since_detect = frames_ahead
+        return predicted
+
+    def skip_frame(self) -> None:
+        """
+        Count a frame that was not tracked, e.g. one skipped by a MotionGate, so the
+        detection cadence and the frame gap used for velocities include it.
+        """
+        self._frames_since_detect += 1
+
+    def predict_tracks(self, frames_ahead: int = 1) -> List[Dict[str, Any]]:
+        """
+        Predict track boxes `frames_ahead` frames after the last full detection.
+
+        Args:
+            frames_ahead (int): Number of frames since the last full detection.
+
+        Returns:
+            List[Dict[str, Any]]: Predicted tracking results with `predicted=True`.
+        """
+        predicted = []
+        for track_id, state in self._motion_states.items():
+            box = state['box'] + state['velocity'] * frames_ahead
+            predicted.append({
+                'track_id': track_id,
+                'class_id': state['class_id'],
+                'class_name': self.classes[state['class_id']],
+                'box': box.tolist(),
+                'predicted': True
+            })
+        return predicted
+
+    def _update_motion_states(self, tracking_results: List[Dict[str, Any]]) -> None:
+        """Refresh per-track velocities from a full detection; tracks that disappeared are dropped."""
+        elapsed = self._frames_since_detect + 1
+        motion_states = {}
+        for tracking_result in tracking_results:
+            track_id = tracking_result['track_id']
+            box = np.asarray(tracking_result['box'], dtype=np.float64)
+            velocity = np.zeros(4, dtype=np.float64)
+            previous = self._motion_states.get(track_id)
+            if previous is not None:
+                measured = (box - previous['box']) / elapsed
+                velocity = self.velocity_smoothing * previous['velocity'] + \
+                    (1.0 - self.velocity_smoothing) * measured
+            motion_states[track_id] = {
+                'box': box,
+                'velocity': velocity,
+                'class_id': tracking_result['class_id']
+            }
+        self._motion_states = motion_states
+        self._frames_since_detect = 0
+
     def draw_tracking_results(self, image: np.ndarray, tracking_results: List[Dict[str, Any]]) -> np.ndarray:
         """
         Draw tracking results on the input image.
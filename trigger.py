@@ -7,10 +7,19 @@ Trigger
 2) 输入检测框，输出命中触发线的框及其所在车道信息
 """
 import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
 from typing import Dict, List, Tuple, Optional, Any
 
+import cv2
 import numpy as np
 
+from track_state import TrackState, TrackStateStore
+
+logger = logging.getLogger(__name__)
+
 
 def point_in_polygon(point: Tuple[float, float], polygon: List[Dict[str, float]]) -> bool:
     """射线法判断点是否在多边形内"""
@@ -25,6 +34,27 @@ def point_in_polygon(point: Tuple[float, float], polygon: List[Dict[str, float]]
     return inside
 
 
+def points_in_polygon(xs: np.ndarray, ys: np.ndarray, polygon: np.ndarray) -> np.ndarray:
+    """
+    射线法批量判断点是否在多边形内，判定规则与 point_in_polygon 一致
+
+    参数:
+        xs, ys: (N,) 点坐标
+        polygon: (K, 2) 多边形顶点
+
+    返回:
+        (N,) 布尔数组
+    """
+    x1 = polygon[:, 0][None, :]
+    y1 = polygon[:, 1][None, :]
+    x2 = np.roll(polygon[:, 0], -1)[None, :]
+    y2 = np.roll(polygon[:, 1], -1)[None, :]
+    x = xs[:, None]
+    y = ys[:, None]
+    crosses = ((y1 > y) != (y2 > y)) & (x < (x2 - x1) * (y - y1) / (y2 - y1 + 1e-9) + x1)
+    return (np.count_nonzero(crosses, axis=1) % 2) == 1
+
+
 def point_to_segment_distance(px: float, py: float, x1: float, y1: float, x2: float, y2: float) -> float:
     ab = (x2 - x1, y2 - y1)
     ap = (px - x1, py - y1)
@@ -32,19 +62,187 @@ def point_to_segment_distance(px: float, py: float, x1: float, y1: float, x2: fl
     ab_length = np.sqrt(ab[0]**2 + ab[1]**2)
     return cross_product / ab_length
 
+
+def points_to_segments_distance(px: np.ndarray, py: np.ndarray,
+                                seg_start: np.ndarray, seg_vec: np.ndarray, seg_len: np.ndarray) -> np.ndarray:
+    """
+    批量计算点到触发线段的距离矩阵，与 point_to_segment_distance 公式一致
+
+    参数:
+        px, py: (N,) 点坐标
+        seg_start: (S, 2) 线段起点
+        seg_vec: (S, 2) 线段向量（终点 - 起点）
+        seg_len: (S,) 线段长度
+
+    返回:
+        (N, S) 距离矩阵，长度为 0 的线段对应 nan/inf（不会命中）
+    """
+    apx = px[:, None] - seg_start[None, :, 0]
+    apy = py[:, None] - seg_start[None, :, 1]
+    cross_product = np.abs(seg_vec[None, :, 0] * apy - seg_vec[None, :, 1] * apx)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return cross_product / seg_len[None, :]
+
+
+def points_to_segments_clamped_distance(px: np.ndarray, py: np.ndarray,
+                                        seg_start: np.ndarray, seg_vec: np.ndarray) -> np.ndarray:
+    """
+    批量计算点到触发线段的最近距离（投影限制在线段两端之间，不延长为直线）
+
+    参数:
+        px, py: (N,) 点坐标
+        seg_start: (S, 2) 线段起点
+        seg_vec: (S, 2) 线段向量（终点 - 起点）
+
+    返回:
+        (N, S) 距离矩阵，长度为 0 的线段取到起点的距离
+    """
+    apx = px[:, None] - seg_start[None, :, 0]
+    apy = py[:, None] - seg_start[None, :, 1]
+    seg_len2 = (seg_vec ** 2).sum(axis=1)[None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (apx * seg_vec[None, :, 0] + apy * seg_vec[None, :, 1]) / seg_len2
+    t = np.clip(np.nan_to_num(t), 0.0, 1.0)
+    return np.hypot(apx - t * seg_vec[None, :, 0], apy - t * seg_vec[None, :, 1])
+
+
+def segments_intersect(p: np.ndarray, q: np.ndarray, seg_start: np.ndarray, seg_vec: np.ndarray) -> np.ndarray:
+    """
+    批量判断运动线段 p->q 是否与触发线段相交（端点相接也算相交，平行/共线不算）
+
+    参数:
+        p, q: (M, 2) 运动线段起点和终点
+        seg_start: (S, 2) 触发线段起点
+        seg_vec: (S, 2) 触发线段向量
+
+    返回:
+        (M, S) 布尔矩阵
+    """
+    d = (q - p)[:, None, :]
+    e = seg_vec[None, :, :]
+    ap = seg_start[None, :, :] - p[:, None, :]
+    denom = d[..., 0] * e[..., 1] - d[..., 1] * e[..., 0]
+    t_num = ap[..., 0] * e[..., 1] - ap[..., 1] * e[..., 0]
+    u_num = ap[..., 0] * d[..., 1] - ap[..., 1] * d[..., 0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = t_num / denom
+        u = u_num / denom
+    return (denom != 0) & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+
+
+@dataclass
+class TriggerGeometry:
+    """按缩放因子预编译的车道与触发线几何数据，只在加载配置或 set_scale 时重建"""
+    lanes: List[Dict]
+    triggers: List[Dict]
+    scale_x: float
+    scale_y: float
+    lane_polygons: List[np.ndarray]  # 缩放后的车道多边形 (K, 2)，只包含顶点数 >= 3 的车道
+    lane_indices: List[int]          # lane_polygons 对应 lanes 中的下标
+    lane_points: List[List[Dict[str, float]]]  # 缩放后的车道顶点，供单点射线法判断
+    seg_start: np.ndarray            # (S, 2) 缩放后的触发线段起点
+    seg_vec: np.ndarray              # (S, 2) 缩放后的触发线段向量
+    seg_len: np.ndarray              # (S,) 线段长度
+    seg_owner: np.ndarray            # (S, T) 线段到触发线的归属矩阵
+    lane_mask: Optional[np.ndarray] = None  # (H, W) uint8 车道标签图，0 表示不在任何车道，k 表示 lane_polygons[k - 1]
+
+
+# 标签图中车道边界像素的标签，落在边界上的点退回射线法精确判断
+MASK_EDGE_LABEL = 255
+# 标签图用 uint8 存储，车道数超过上限时退回多边形判断
+MAX_MASK_LANES = MASK_EDGE_LABEL - 1
+# fillPoly 亚像素精度的小数位数
+MASK_SHIFT = 4
+
+
+def rasterize_lanes(lane_polygons: List[np.ndarray], frame_size: Tuple[int, int]) -> Optional[np.ndarray]:
+    """
+    把车道多边形栅格化为 uint8 标签图，重叠区域归属于列表中靠前的车道（与逐个判断的顺序一致），
+    多边形边界附近的像素标记为 MASK_EDGE_LABEL，查表时对这些点做精确判断
+
+    参数:
+        lane_polygons: 缩放后的车道多边形 (K, 2)
+        frame_size: (width, height) 工作分辨率
+
+    返回:
+        (H, W) 标签图，车道数超过 MAX_MASK_LANES 时返回 None
+    """
+    if len(lane_polygons) > MAX_MASK_LANES:
+        return None
+    width, height = frame_size
+    mask = np.zeros((height, width), dtype=np.uint8)
+    polys = [np.round(poly * (1 << MASK_SHIFT)).astype(np.int32) for poly in lane_polygons]
+    for label in range(len(polys), 0, -1):
+        cv2.fillPoly(mask, [polys[label - 1]], label, lineType=cv2.LINE_8, shift=MASK_SHIFT)
+    cv2.polylines(mask, polys, True, MASK_EDGE_LABEL, thickness=2, lineType=cv2.LINE_8, shift=MASK_SHIFT)
+    return mask
+
+
+def compile_geometry(lanes: List[Dict], triggers: List[Dict], scale_x: float, scale_y: float,
+                     frame_size: Optional[Tuple[int, int]] = None) -> TriggerGeometry:
+    """把车道多边形和触发线按缩放因子编译成 NumPy 数组；给定 frame_size 时同时生成车道标签图"""
+    scale = np.array([scale_x, scale_y], dtype=np.float64)
+
+    lane_polygons, lane_indices = [], []
+    for lane_idx, lane in enumerate(lanes):
+        pts = lane.get("points", [])
+        if len(pts) >= 3:
+            lane_polygons.append(np.array([(p["x"], p["y"]) for p in pts], dtype=np.float64) * scale)
+            lane_indices.append(lane_idx)
+    lane_points = [[{"x": float(x), "y": float(y)} for x, y in poly] for poly in lane_polygons]
+
+    starts, ends, owners = [], [], []
+    for trig_idx, trig in enumerate(triggers):
+        pts = trig.get("points", [])
+        for i in range(len(pts) - 1):
+            starts.append((pts[i]["x"], pts[i]["y"]))
+            ends.append((pts[i + 1]["x"], pts[i + 1]["y"]))
+            owners.append(trig_idx)
+    seg_start = np.array(starts, dtype=np.float64).reshape(-1, 2) * scale
+    seg_vec = np.array(ends, dtype=np.float64).reshape(-1, 2) * scale - seg_start
+    seg_owner = np.zeros((len(owners), len(triggers)), dtype=np.float64)
+    seg_owner[np.arange(len(owners)), owners] = 1.0
+
+    return TriggerGeometry(
+        lanes=lanes,
+        triggers=triggers,
+        scale_x=scale_x,
+        scale_y=scale_y,
+        lane_polygons=lane_polygons,
+        lane_indices=lane_indices,
+        lane_points=lane_points,
+        seg_start=seg_start,
+        seg_vec=seg_vec,
+        seg_len=np.sqrt((seg_vec ** 2).sum(axis=1)),
+        seg_owner=seg_owner,
+        lane_mask=rasterize_lanes(lane_polygons, frame_size) if frame_size else None,
+    )
+
+
 class Trigger:
     """
     用于车道与触发线分析。
     - 读取车道和触发线配置文件
     - 输入检测框，输出命中触发线的框及其所在车道信息
     - 支持配置车道检测点：中心点、上边沿中心点或下边沿中心点
+    - 支持两种触发模式：
+        distance: 框中心到触发线的距离小于 0.5*min(w, h) 时触发
+        crossing: 同一 track_id 的检测点从上一帧到当前帧的运动轨迹穿过触发线时触发，
+                  低帧率下快速车辆跳过距离带也不会漏触发
+    - 支持热加载配置：reload() 在后台线程编译新几何数据，在下一帧开始时原子替换，
+      track 状态（触发状态、检测点历史）保持不变
     """
 
+    TRIGGER_MODES = ["distance", "crossing"]
+
     def __init__(
         self,
         lane_trigger_path: str = "lane_trigger_data.json",
         video_size: Optional[Dict[str, int]] = None,
-        lane_detection_point: str = "center"  # 可选值: "center", "top_center", "bottom_center"
+        lane_detection_point: str = "center",  # 可选值: "center", "top_center", "bottom_center"
+        trigger_mode: str = "distance",  # 可选值: "distance", "crossing"
+        max_tracks: int = 1000,
+        track_ttl_ms: Optional[float] = 120000.0
     ) -> None:
         self.lane_trigger_path = lane_trigger_path
 
@@ -52,11 +250,14 @@ class Trigger:
         self.lanes, self.triggers, config_video_size = self._load_lane_trigger()
         
         # 视频尺寸（优先使用外部传入的参数，其次使用配置文件中的尺寸）
+        self._video_size_override = video_size
         self.video_size = video_size or config_video_size
 
         # 缩放因子（根据实际视频尺寸和配置尺寸计算）
         self.scale_x = 1.0
         self.scale_y = 1.0
+        # 工作分辨率 (width, height)，set_scale 之后才有车道标签图
+        self.frame_size: Optional[Tuple[int, int]] = None
         
         # 车道检测点配置
         valid_points = ["center", "top_center", "bottom_center"]
@@ -64,59 +265,281 @@ class Trigger:
             raise ValueError(f"lane_detection_point 必须是 {valid_points} 中的一个，当前值: {lane_detection_point}")
         self.lane_detection_point = lane_detection_point
 
-        self.used_track_ids = set()
-        self.max_track_ids = 1000
+        # 触发模式
+        self.set_trigger_mode(trigger_mode)
+
+        # 预编译几何数据，只在加载配置或 set_scale 时重建
+        self._geometry = compile_geometry(self.lanes, self.triggers, self.scale_x, self.scale_y)
 
-    def _load_lane_trigger(self) -> Tuple[List[Dict], List[Dict], Dict[str, int]]:
+        # 按 track_id 保存的状态（触发状态、车道、检测点历史），有界且按最后出现时间淘汰
+        self.track_store = TrackStateStore(max_tracks=max_tracks, ttl_ms=track_ttl_ms)
+        self._frame_index = 0
+
+        # 热加载：后台线程编译好的配置，在推理线程的下一帧开始时替换
+        # _compile_lock 使多次 reload 按顺序编译，_reload_lock 保护待替换槽位的读写
+        self._pending_reload: Optional[Tuple] = None
+        self._compile_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+
+    def set_trigger_mode(self, trigger_mode: str) -> None:
+        """设置触发模式：distance 或 crossing"""
+        if trigger_mode not in self.TRIGGER_MODES:
+            raise ValueError(f"trigger_mode 必须是 {self.TRIGGER_MODES} 中的一个，当前值: {trigger_mode}")
+        self.trigger_mode = trigger_mode
+
+    def _load_lane_trigger(self, lane_trigger_path: Optional[str] = None) -> Tuple[List[Dict], List[Dict], Dict[str, int]]:
         """加载车道线和触发线配置文件"""
-        with open(self.lane_trigger_path, "r", encoding="utf-8") as f:
+        with open(lane_trigger_path or self.lane_trigger_path, "r", encoding="utf-8") as f:
             data = json.load(f)
         lanes = data.get("lanes", [])
         triggers = data.get("triggers", [])
         video_size = data.get("videoSize", {})
         return lanes, triggers, video_size
 
-    def set_scale(self, frame_width: int, frame_height: int) -> None:
-        """根据实际视频尺寸和配置尺寸计算缩放因子"""
-        if not self.video_size:
-            self.scale_x = self.scale_y = 1.0
-            return
-        
-        vw = self.video_size.get("width", frame_width)
-        vh = self.video_size.get("height", frame_height)
-        
+    @staticmethod
+    def _compute_scale(video_size: Dict[str, int], frame_size: Optional[Tuple[int, int]]) -> Tuple[float, float]:
+        """根据配置尺寸和实际帧尺寸计算缩放因子"""
+        if not video_size or frame_size is None:
+            return 1.0, 1.0
+        frame_width, frame_height = frame_size
+        vw = video_size.get("width", frame_width)
+        vh = video_size.get("height", frame_height)
         if vw == 0 or vh == 0:
-            self.scale_x = self.scale_y = 1.0
-            return
-        
-        self.scale_x = frame_width / vw
-        self.scale_y = frame_height / vh
+            return 1.0, 1.0
+        return frame_width / vw, frame_height / vh
+
+    def set_scale(self, frame_width: int, frame_height: int) -> bool:
+        """
+        根据实际视频尺寸和配置尺寸计算缩放因子，并按该分辨率重建车道标签图
+
+        返回:
+            几何数据是否发生变化（帧尺寸变化或替换了热加载的配置），调用方据此刷新依赖车道多边形的状态
+        """
+        reloaded = self._apply_pending_reload()
+        if self.frame_size == (frame_width, frame_height):
+            return reloaded
+        self.frame_size = (frame_width, frame_height)
+        self.scale_x, self.scale_y = self._compute_scale(self.video_size, self.frame_size)
+        self._geometry = compile_geometry(
+            self.lanes, self.triggers, self.scale_x, self.scale_y, self.frame_size)
+        return True
+
+    def reload(self, lane_trigger_path: Optional[str] = None, block: bool = False) -> None:
+        """
+        重新加载配置：在后台线程读取并编译新的车道和触发线，下一帧开始时原子替换
+
+        参数:
+            lane_trigger_path: 新的配置文件路径，None 表示重新读取当前文件
+            block: 是否等待编译完成（替换仍然发生在下一帧开始时）
+        """
+        thread = threading.Thread(target=self._reload_worker, args=(lane_trigger_path,))
+        thread.daemon = True
+        thread.start()
+        if block:
+            thread.join()
+
+    def _reload_worker(self, lane_trigger_path: Optional[str]) -> None:
+        """后台读取并编译配置，完成后放入待替换槽位"""
+        path = lane_trigger_path or self.lane_trigger_path
+        with self._compile_lock:
+            try:
+                lanes, triggers, config_video_size = self._load_lane_trigger(path)
+                video_size = self._video_size_override or config_video_size
+                frame_size = self.frame_size
+                scale_x, scale_y = self._compute_scale(video_size, frame_size)
+                geometry = compile_geometry(lanes, triggers, scale_x, scale_y, frame_size)
+            except Exception as e:
+                logger.error(f"Failed to reload trigger config {path}: {e}")
+                return
+            with self._reload_lock:
+                self._pending_reload = (path, lanes, triggers, video_size, frame_size, geometry)
+            logger.info(f"Trigger config {path} compiled: {len(lanes)} lanes, {len(triggers)} triggers")
+
+    def _apply_pending_reload(self) -> bool:
+        """在推理线程中替换为后台编译好的配置（帧与帧之间调用），返回是否发生了替换"""
+        if self._pending_reload is None:
+            return False
+        # 取出和清空在同一把锁内完成，编译线程此时发布的更新配置不会被覆盖丢失
+        with self._reload_lock:
+            pending, self._pending_reload = self._pending_reload, None
+        if pending is None:
+            return False
+        path, lanes, triggers, video_size, frame_size, geometry = pending
+
+        scale_x, scale_y = self._compute_scale(video_size, self.frame_size)
+        if frame_size != self.frame_size:
+            # 编译期间帧尺寸发生了变化，按当前尺寸重新编译
+            geometry = compile_geometry(lanes, triggers, scale_x, scale_y, self.frame_size)
+
+        self.lane_trigger_path = path
+        self.lanes, self.triggers, self.video_size = lanes, triggers, video_size
+        self.scale_x, self.scale_y = scale_x, scale_y
+        self._geometry = geometry
+        return True
 
     def _scale_point(self, p: Dict[str, float]) -> Tuple[float, float]:
         """缩放点坐标"""
         return p["x"] * self.scale_x, p["y"] * self.scale_y
 
-    def _trigger_hits(self, box: Tuple[float, float, float, float]) -> List[Dict]:
+    def _trigger_hits_batch(self, boxes: np.ndarray, threshold_scale: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量判断所有框与所有触发线段的命中关系
+
+        参数:
+            boxes: (N, 4) 框坐标 (x1, y1, x2, y2)
+            threshold_scale: 距离阈值的放大倍数
+
+        返回:
+            (box_idx, trigger_idx) 命中对的下标数组，按框、触发线顺序排列
+        """
+        geo = self._geometry
+        empty = np.empty(0, dtype=np.int64)
+        if len(boxes) == 0 or len(geo.seg_start) == 0:
+            return empty, empty
+
+        cx = (boxes[:, 0] + boxes[:, 2]) / 2
+        cy = (boxes[:, 1] + boxes[:, 3]) / 2
+        w = np.maximum(1.0, boxes[:, 2] - boxes[:, 0])
+        h = np.maximum(1.0, boxes[:, 3] - boxes[:, 1])
+        threshold = 0.5 * np.minimum(w, h) * threshold_scale  # 距离阈值
+
+        dist = points_to_segments_distance(cx, cy, geo.seg_start, geo.seg_vec, geo.seg_len)
+        seg_hits = dist <= threshold[:, None]
+        trigger_hits = (seg_hits.astype(np.float64) @ geo.seg_owner) > 0
+        return np.nonzero(trigger_hits)
+
+    def _crossing_hits_batch(self, boxes: np.ndarray, states: List[TrackState]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        批量判断各 track 的检测点从上一帧位置到当前位置的运动线段是否穿过触发线
+
+        参数:
+            boxes: (N, 4) 框坐标 (x1, y1, x2, y2)
+            states: 每个框对应的 track 状态（history 末尾为上一帧检测点）
+
+        返回:
+            (box_idx, trigger_idx) 命中对的下标数组，按框、触发线顺序排列
+        """
+        geo = self._geometry
+        empty = np.empty(0, dtype=np.int64)
+        moved_idx = [i for i, state in enumerate(states) if state.history]
+        if not moved_idx or len(geo.seg_start) == 0:
+            return empty, empty
+
+        xs, ys = self._detection_points(boxes[moved_idx])
+        previous = np.asarray([states[i].history[-1] for i in moved_idx], dtype=np.float64)
+        crossed = segments_intersect(previous, np.column_stack([xs, ys]), geo.seg_start, geo.seg_vec)
+        trigger_hits = (crossed.astype(np.float64) @ geo.seg_owner) > 0
+        row_idx, trig_idx = np.nonzero(trigger_hits)
+        return np.asarray(moved_idx, dtype=np.int64)[row_idx], trig_idx
+
+    def _trigger_hits(self, box: Tuple[float, float, float, float], threshold_scale: float = 1.0) -> List[Dict]:
         """判断一个框是否命中任意触发线，返回命中的触发线列表"""
-        x1, y1, x2, y2 = box
-        cx = (x1 + x2) / 2
-        cy = (y1 + y2) / 2
-        w = max(1.0, x2 - x1)
-        h = max(1.0, y2 - y1)
-        threshold = 0.5 * min(w, h)  # 距离阈值
-        hits = []
-        
-        for trig in self.triggers:
-            pts = trig.get("points", [])
-            for i in range(len(pts) - 1):
-                x3, y3 = self._scale_point(pts[i])
-                x4, y4 = self._scale_point(pts[i + 1])
-                dist = point_to_segment_distance(cx, cy, x3, y3, x4, y4)
-                if dist <= threshold:
-                    hits.append(trig)
-                    break
-        
-        return hits
+        _, trig_idx = self._trigger_hits_batch(np.asarray([box], dtype=np.float64), threshold_scale)
+        return [self._geometry.triggers[i] for i in trig_idx]
+
+    def _near_crossing(self, boxes: np.ndarray, track_ids: List[Any], margin: float) -> bool:
+        """
+        crossing 模式下判断是否有框接近触发线：检测点到触发线段的距离不超过 0.5*min(w, h)*margin，
+        或检测点从该 track 上一次记录的位置到当前位置的运动线段已经穿过触发线
+        """
+        geo = self._geometry
+        if len(boxes) == 0 or len(geo.seg_start) == 0:
+            return False
+
+        xs, ys = self._detection_points(boxes)
+        w = np.maximum(1.0, boxes[:, 2] - boxes[:, 0])
+        h = np.maximum(1.0, boxes[:, 3] - boxes[:, 1])
+        threshold = 0.5 * np.minimum(w, h) * margin
+        dist = points_to_segments_clamped_distance(xs, ys, geo.seg_start, geo.seg_vec)
+        if (dist <= threshold[:, None]).any():
+            return True
+
+        previous, current = [], []
+        for track_id, x, y in zip(track_ids, xs.tolist(), ys.tolist()):
+            state = self.track_store.get(track_id) if track_id is not None else None
+            if state is not None and state.history:
+                previous.append(state.history[-1])
+                current.append((x, y))
+        if not previous:
+            return False
+        crossed = segments_intersect(np.asarray(previous, dtype=np.float64), np.asarray(current, dtype=np.float64),
+                                     geo.seg_start, geo.seg_vec)
+        return bool(crossed.any())
+
+    def near_trigger(self, boxes: List[Dict[str, Any]], margin: float = 2.0) -> bool:
+        """
+        判断是否有框接近触发线（距离阈值放大 margin 倍），用于提前触发完整检测；
+        判定方式与触发模式一致：distance 模式用框中心到触发线的距离，
+        crossing 模式用检测点到触发线段的距离和检测点的运动轨迹
+
+        参数:
+            boxes: 检测框列表，格式同 process_boxes
+            margin: 距离阈值的放大倍数
+
+        返回:
+            任意框接近触发线时返回 True
+        """
+        self._apply_pending_reload()
+        if not boxes:
+            return False
+        box_arr = np.asarray([box_info["box"] for box_info in boxes], dtype=np.float64)
+        if self.trigger_mode == "crossing":
+            return self._near_crossing(box_arr, [box_info.get("track_id") for box_info in boxes], margin)
+        box_idx, _ = self._trigger_hits_batch(box_arr, margin)
+        return len(box_idx) > 0
+
+    def _detection_points(self, boxes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """根据配置的车道检测点，批量计算框的检测点坐标"""
+        cx = (boxes[:, 0] + boxes[:, 2]) / 2
+        if self.lane_detection_point == "top_center":
+            # 上边沿中心点
+            return cx, boxes[:, 1]
+        if self.lane_detection_point == "bottom_center":
+            # 下边沿中心点
+            return cx, boxes[:, 3]
+        # 中心点
+        return cx, (boxes[:, 1] + boxes[:, 3]) / 2
+
+    def _locate_lanes(self, boxes: np.ndarray) -> np.ndarray:
+        """
+        批量判断框的检测点落在哪个车道多边形内
+
+        参数:
+            boxes: (N, 4) 框坐标 (x1, y1, x2, y2)
+
+        返回:
+            (N,) 车道在 lanes 中的下标，未找到为 -1
+        """
+        geo = self._geometry
+        lane_of_box = np.full(len(boxes), -1, dtype=np.int64)
+        if len(boxes) == 0 or not geo.lane_polygons:
+            return lane_of_box
+        xs, ys = self._detection_points(boxes)
+        lane_indices = np.asarray(geo.lane_indices, dtype=np.int64)
+        pending = np.ones(len(boxes), dtype=bool)
+
+        if geo.lane_mask is not None:
+            # 标签图查表：每个点一次数组读取
+            height, width = geo.lane_mask.shape
+            px = np.round(xs).astype(np.int64)
+            py = np.round(ys).astype(np.int64)
+            in_frame = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+            labels = np.zeros(len(boxes), dtype=np.int64)
+            labels[in_frame] = geo.lane_mask[py[in_frame], px[in_frame]]
+            found = (labels > 0) & (labels != MASK_EDGE_LABEL)
+            lane_of_box[found] = lane_indices[labels[found] - 1]
+            # 只有落在车道边界像素上或画面外的点需要精确判断
+            pending = (labels == MASK_EDGE_LABEL) | ~in_frame
+
+        # 逐个车道做射线法判断，先匹配到的车道优先；标签图已全部判定时跳过
+        for lane_idx, poly in zip(lane_indices, geo.lane_polygons):
+            if not pending.any():
+                break
+            inside = pending.copy()
+            inside[pending] = points_in_polygon(xs[pending], ys[pending], poly)
+            lane_of_box[inside] = lane_idx
+            pending &= ~inside
+        return lane_of_box
 
     def _locate_lane(self, box: Tuple[float, float, float, float]) -> Optional[Dict]:
         """
@@ -128,27 +551,33 @@ class Trigger:
         返回:
             车道信息，如果未找到返回 None
         """
+        geo = self._geometry
+        if not geo.lane_polygons:
+            return None
         x1, y1, x2, y2 = box
-        
-        # 根据配置选择检测点
-        if self.lane_detection_point == "center":
-            # 中心点
-            cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
-        elif self.lane_detection_point == "top_center":
-            # 上边沿中心点
-            cx, cy = (x1 + x2) / 2, y1
+        cx = (x1 + x2) / 2
+        if self.lane_detection_point == "top_center":
+            cy = y1
         elif self.lane_detection_point == "bottom_center":
-            # 下边沿中心点
-            cx, cy = (x1 + x2) / 2, y2
+            cy = y2
         else:
-            # 默认使用中心点
-            cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
-        
-        for lane in self.lanes:
-            poly = [{"x": p["x"] * self.scale_x, "y": p["y"] * self.scale_y} for p in lane.get("points", [])]
-            if len(poly) >= 3 and point_in_polygon((cx, cy), poly):
-                return lane
-        
+            cy = (y1 + y2) / 2
+
+        if geo.lane_mask is not None:
+            # 单个框直接查标签图，不构造数组；与 _locate_lanes 相同的取整规则
+            height, width = geo.lane_mask.shape
+            px, py = int(round(cx)), int(round(cy))
+            if 0 <= px < width and 0 <= py < height:
+                label = int(geo.lane_mask[py, px])
+                if label == 0:
+                    return None
+                if label != MASK_EDGE_LABEL:
+                    return geo.lanes[geo.lane_indices[label - 1]]
+
+        # 边界像素、画面外或没有标签图时，逐个车道做射线法判断
+        for lane_idx, poly in zip(geo.lane_indices, geo.lane_points):
+            if point_in_polygon((cx, cy), poly):
+                return geo.lanes[lane_idx]
         return None
 
     # @staticmethod
@@ -185,38 +614,65 @@ class Trigger:
             使用的车道检测点由构造函数中的 lane_detection_point 参数决定，
             可选值: "center" (中心点), "top_center" (上边沿中心点), "bottom_center" (下边沿中心点)
         """
+        self._apply_pending_reload()
         triggered_boxes = []
-        
-        for box_info in boxes:
-            box = box_info["box"]
-            track_id = box_info['track_id']
+        if not boxes:
+            return triggered_boxes
 
-            hits = self._trigger_hits(box)
-            
-            if not hits:
-                continue
+        # 刷新本帧所有 track 的状态，并淘汰长时间未出现的 track
+        self._frame_index += 1
+        now_ms = time.monotonic() * 1000
+        self.track_store.expire(self._frame_index, now_ms)
+        states = [self.track_store.touch(box_info['track_id'], self._frame_index, now_ms)
+                  for box_info in boxes]
+
+        # 一次性计算所有框与所有触发线的命中关系
+        box_arr = np.asarray([box_info["box"] for box_info in boxes], dtype=np.float64)
+        if self.trigger_mode == "crossing":
+            hit_box_idx, hit_trig_idx = self._crossing_hits_batch(box_arr, states)
+        else:
+            hit_box_idx, hit_trig_idx = self._trigger_hits_batch(box_arr)
+
+        # 记录本帧检测点，供 crossing 模式下一帧使用
+        xs, ys = self._detection_points(box_arr)
+        for state, x, y in zip(states, xs.tolist(), ys.tolist()):
+            state.history.append((x, y))
+
+        if len(hit_box_idx) == 0:
+            return triggered_boxes
+
+        # 按框分组：unique 返回每个框第一次出现的位置
+        hit_boxes, group_starts = np.unique(hit_box_idx, return_index=True)
+        group_ends = np.append(group_starts[1:], len(hit_box_idx))
+
+        # 批量查找命中框所在车道
+        lane_of_box = self._locate_lanes(box_arr[hit_boxes])
+
+        for box_i, start, end, lane_idx in zip(hit_boxes, group_starts, group_ends, lane_of_box):
+            box_info = boxes[box_i]
+            state = states[box_i]
+
+            hits = [self._geometry.triggers[i] for i in hit_trig_idx[start:end]]
             
             # 查找所在车道
-            lane = self._locate_lane(box)
+            lane = self._geometry.lanes[lane_idx] if lane_idx >= 0 else None
 
             if not lane:
                 continue
+            state.lane_name = lane.get("name")
             
-            # 记录所有命中的触发线
+            # 记录所有命中的触发线；同一 track 只有第一次命中为 triggered
             for trig in hits:
+                trigger_name = trig.get("name", "trigger")
                 result = box_info.copy()
                 result.update({
                     "lane_name": lane.get("name") if lane else None,
                     "lane_number": lane.get("number") if lane else None,
-                    "trigger_name": trig.get("name", "trigger"),
-                    "status": "triggered" if track_id not in self.used_track_ids else "ongoing"
+                    "trigger_name": trigger_name,
+                    "status": "triggered" if not state.triggered else "ongoing"
                 })
                 triggered_boxes.append(result)
-                
-                if track_id not in self.used_track_ids:
-                    self.used_track_ids.add(track_id)
-                    while len(self.used_track_ids) >= self.max_track_ids:
-                        self.used_track_ids.pop()
+                state.triggered_lines.add(trigger_name)
         
         return triggered_boxes
 
@@ -224,6 +680,12 @@ class Trigger:
         """获取所有车道信息"""
         return self.lanes
     
+    def get_lane_polygons(self) -> List[np.ndarray]:
+        """获取缩放后的车道多边形顶点数组 (N x 2)，已编译但尚未替换的热加载配置优先"""
+        pending = self._pending_reload
+        geometry = pending[-1] if pending is not None else self._geometry
+        return list(geometry.lane_polygons)
+
     def get_triggers(self) -> List[Dict]:
         """获取所有触发线信息"""
         return self.triggers
\ No newline at end of file
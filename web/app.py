@@ -2,12 +2,14 @@
 # -*- coding: utf-8 -*-
 import os
 import sys
+import atexit
 import json
 import logging
 import tempfile
 import queue
 import time
 import threading
+from typing import Dict, List, Optional
 from flask import Flask, request, jsonify, Response
 import cv2
 import numpy as np
@@ -25,7 +27,10 @@ try:
     from matcher import Matcher
     from trigger import Trigger
     from tracker import Tracker
+    from motion_gate import MotionGate
+    from inference_server import InferenceServer, StreamTracker
     from backend.scripts.data_adapter import DataAdapter
+    from backend.scripts.camera_source import RtspCameraSource
     from backend.modules.camera_modules import ImageData
     from backend.modules.simpl_modules import *
     from backend.scripts.pointcloud_adapter import PointCloudAdapter
@@ -83,7 +88,14 @@ current_tracker = None
 current_trigger = None
 current_matcher = None
 current_pointcloud_adapter = None
+current_motion_gate = None
+inference_server = None  # 多路相机共享的推理服务，按需创建
+inference_server_options = None  # 创建 inference_server 时的会话参数
+camera_streams = {}  # 与主会话并发的附加相机流，key: stream_id，共用 inference_server
+camera_streams_lock = threading.Lock()
 save_results = SaveResults()
+# 退出时写完剩余结果；CSV 跨重启累积，Excel 改由 /api/results/export 按需导出
+atexit.register(save_results.stop, export_excel=False)
 
 # 统计数据映射
 map_lock = threading.Lock()
@@ -103,6 +115,11 @@ points_queue = SafeQueue(maxsize=10, name="final_points")
 # config_file = os.path.join(os.path.dirname(__file__), 'config.json')
 config_file = None
 
+
+def get_config_path() -> str:
+    """车道/触发线配置文件路径，未指定时使用 web/config.json"""
+    return config_file or os.path.join(os.path.dirname(__file__), 'config.json')
+
 # 视频帧生成器
 
 
@@ -171,21 +188,36 @@ def generate_points_from_adapter():
 # 图像回调函数
 
 
-def image_callback(image_data: ImageData):
-    """处理接收到的图像数据"""
+def process_frame(image_data: ImageData, tracker, trigger: Optional[Trigger],
+                  motion_gate: Optional[MotionGate]) -> np.ndarray:
+    """
+    跟踪一帧并判断触发，触发的图像送入Matcher，返回画好跟踪框的显示图像；
+    主会话和附加的相机流都走这里，各自传入自己的 Tracker、Trigger 和运动门控
+    """
     image_display = image_data.image.copy()
+    if trigger is not None:
+        # 按实际帧尺寸缩放配置（尺寸不变时不重建车道标签图），几何数据变化时同步运动门控的ROI
+        frame_height, frame_width = image_data.image.shape[:2]
+        if trigger.set_scale(frame_width, frame_height) and motion_gate is not None:
+            motion_gate.set_roi(trigger.get_lane_polygons())
+    # 车道区域静止时跳过检测
+    run_detection = True
+    if motion_gate is not None:
+        run_detection = motion_gate.has_motion(image_data.image)
+    if tracker is not None and not run_detection:
+        # 跳过的帧同样计入检测节奏和速度估计的帧间隔
+        tracker.skip_frame()
     # 处理跟踪结果
-    if current_tracker is not None:
-        track_results = current_tracker.detect_and_track(image_data.image)
-        if current_trigger is not None:
-            trigger_results = current_trigger.process_boxes(track_results)
+    if tracker is not None and run_detection:
+        should_detect = trigger.near_trigger if trigger is not None else None
+        track_results = tracker.track(
+            image_data.image, should_detect=should_detect)
+        if trigger is not None:
+            trigger_results = trigger.process_boxes(track_results)
+            triggered_images = []
             for result in trigger_results:
 
                 region_name = result.get('lane_name', None)
-                cls_name = result.get('class_name', 'unknown')
-
-                if cls_name not in ['car', 'truck', 'bus']:
-                    continue
 
                 if region_name is None:
                     continue
@@ -207,20 +239,30 @@ def image_callback(image_data: ImageData):
                             channels=image_data.channels,
                             region_name=region_name
                         )
-                        current_tracker.draw_tracking_result(
+                        tracker.draw_tracking_result(
                             image_data_triggered.image, result['box'], result['track_id'], result['class_id'])
-                        matched_results = current_matcher.add_image_data(
-                            image_data_triggered)
-                        if len(matched_results) > 0:
-                            save_results.save_results(matched_results)
+                        triggered_images.append(image_data_triggered)
 
-                current_tracker.draw_tracking_result(
+                tracker.draw_tracking_result(
                     image_display, result['box'], result['track_id'], result['class_id'])
+
+            # 本帧所有触发的图像一次性送入Matcher，结果一次性保存
+            if triggered_images and current_matcher is not None:
+                matched_results = current_matcher.add_images(triggered_images)
+                if len(matched_results) > 0:
+                    save_results.save_results(matched_results)
         else:
             for result in track_results:
-                current_tracker.draw_tracking_result(
+                tracker.draw_tracking_result(
                     image_display, result['box'], result['track_id'], result['class_id'])
 
+    return image_display
+
+
+def image_callback(image_data: ImageData):
+    """处理接收到的图像数据"""
+    image_display = process_frame(image_data, current_tracker, current_trigger, current_motion_gate)
+
     # 将处理后的图像放入队列并通知等待的线程
     with image_condition:
         # 如果队列已满，移除最旧的图像
@@ -245,6 +287,168 @@ def image_callback(image_data: ImageData):
         image_condition.notify_all()
 
 
+DEFAULT_TRACK_CLASSES = ['car', 'truck', 'bus']
+
+
+def is_enabled(value) -> bool:
+    """解析会话参数中的开关值（JSON布尔值或表单字符串）"""
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+def parse_class_names(options) -> List[str]:
+    """解析类别白名单（JSON列表或逗号分隔的表单字符串）"""
+    class_names = options.get('classes', DEFAULT_TRACK_CLASSES)
+    if isinstance(class_names, str):
+        class_names = [name.strip() for name in class_names.split(',') if name.strip()]
+    return class_names
+
+
+def parse_inference_options(options) -> tuple:
+    """解析共享推理服务的会话参数（批大小、等待时间、类别白名单、置信度和NMS阈值）"""
+    return (int(options.get('max_batch_size', 4)),
+            float(options.get('max_wait_ms', 10)),
+            tuple(parse_class_names(options)),
+            float(options.get('conf', 0.5)),
+            float(options.get('iou', 0.7)))
+
+
+def get_inference_server(options) -> InferenceServer:
+    """获取共享推理服务，首次使用或会话参数与当前服务不同时按会话参数（重新）创建"""
+    global inference_server, inference_server_options
+    server_options = parse_inference_options(options)
+    if inference_server is not None and server_options != inference_server_options:
+        with camera_streams_lock:
+            streams_attached = bool(camera_streams)
+        if streams_attached:
+            # 附加的相机流仍在使用当前服务，不能重建
+            logger.warning("Inference options changed but camera streams are attached, keeping the current server")
+            return inference_server
+        logger.info("Inference options changed, rebuilding the shared inference server")
+        inference_server.stop()
+        inference_server = None
+    if inference_server is None:
+        max_batch_size, max_wait_ms, class_names, conf, iou = server_options
+        inference_server = InferenceServer(
+            onnx_model_path='models/yolo11s.pt',
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            class_names=list(class_names),
+            confidence_threshold=conf,
+            nms_threshold=iou)
+        inference_server_options = server_options
+    return inference_server
+
+
+def create_tracker(options, stream_id: str) -> Tracker:
+    """根据会话参数创建Tracker（跟踪器类型、检测节奏、类别白名单、置信度和NMS阈值）"""
+    detect_interval = int(options.get('detect_interval', 1))
+    tracker_type = options.get('tracker', 'botsort')
+    if isinstance(current_tracker, StreamTracker):
+        # 上一个会话的流不再使用，释放其跟踪状态
+        current_tracker.server.unregister_stream(current_tracker.stream_id)
+    if is_enabled(options.get('shared_inference', '')):
+        # 多路相机共用一个模型，按流保存跟踪状态
+        return get_inference_server(options).register_stream(
+            stream_id, detect_interval=detect_interval, tracker_type=tracker_type)
+    return Tracker(onnx_model_path='models/yolo11s.pt',
+                   tracker_type=tracker_type,
+                   detect_interval=detect_interval,
+                   class_names=parse_class_names(options),
+                   confidence_threshold=float(options.get('conf', 0.5)),
+                   nms_threshold=float(options.get('iou', 0.7)))
+
+
+class CameraStream:
+    """
+    与主会话并发运行的附加相机流：独立的取流线程、Trigger 和运动门控，
+    跟踪状态注册在共享推理服务中（按 stream_id），触发的图像送入同一个 Matcher
+    """
+
+    def __init__(self, stream_id: str, rtsp_url: str, tracker: StreamTracker,
+                 trigger: Optional[Trigger], motion_gate: Optional[MotionGate]):
+        self.stream_id = stream_id
+        self.rtsp_url = rtsp_url
+        self.tracker = tracker
+        self.trigger = trigger
+        self.motion_gate = motion_gate
+        self.frames = 0
+        self.errors = 0
+        self.is_running = False
+        self.source = None
+        self.thread = None
+
+    def start(self):
+        """打开RTSP流并启动处理线程"""
+        self.source = RtspCameraSource(self.rtsp_url)
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run, name=f"camera_stream_{self.stream_id}")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        """取最新帧并处理，单帧出错只计数，不退出线程"""
+        while self.is_running:
+            image_data = self.source.get_image()
+            if image_data is None:
+                time.sleep(0.005)
+                continue
+            try:
+                process_frame(image_data, self.tracker, self.trigger, self.motion_gate)
+                self.frames += 1
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Camera stream {self.stream_id} frame error: {e}")
+
+    def stop(self):
+        """停止处理线程，释放RTSP流，并从共享推理服务注销跟踪状态"""
+        self.is_running = False
+        if self.thread is not None and self.thread.is_alive():
+            self.thread.join(timeout=5.0)
+        if self.source is not None:
+            self.source.release()
+        self.tracker.server.unregister_stream(self.stream_id)
+
+    def get_stats(self) -> Dict:
+        """流的处理统计"""
+        return {'stream_id': self.stream_id, 'rtsp_url': self.rtsp_url,
+                'running': self.is_running, 'frames': self.frames, 'errors': self.errors}
+
+
+def stop_camera_streams():
+    """停止全部附加相机流"""
+    with camera_streams_lock:
+        streams = list(camera_streams.values())
+        camera_streams.clear()
+    for stream in streams:
+        stream.stop()
+
+
+def create_motion_gate(options) -> Optional[MotionGate]:
+    """根据会话参数创建运动门控，未启用时返回None"""
+    if not is_enabled(options.get('motion_gate', '')):
+        return None
+    roi_polygons = current_trigger.get_lane_polygons() if current_trigger is not None else None
+    return MotionGate(roi_polygons=roi_polygons,
+                      energy_threshold=float(options.get('motion_threshold', 0.002)))
+
+
+def create_matcher(options) -> Matcher:
+    """
+    根据会话参数创建Matcher，match_mode 为 first（默认）或 nearest；
+    sensor_clock 启用时按传感器时间戳匹配；过期未匹配的数据直接写入结果。
+    nearest 在本地时钟下先扣除估计的图片延迟再配对；车流过于均匀无法估计延迟、
+    且延迟超过车辆间隔一半时会配到相邻车辆，此时应使用 first 或 sensor_clock
+    """
+    if current_matcher is not None:
+        current_matcher.stop()
+    matcher = Matcher(match_mode=options.get('match_mode') or 'first',
+                      lookahead_ms=float(options.get('lookahead_ms', 500)),
+                      use_local_timestamp=not is_enabled(options.get('sensor_clock', '')),
+                      sensor_time_diff_ms=float(options.get('sensor_time_diff_ms', 300)))
+    matcher.set_result_sink(save_results.save_results)
+    return matcher
+
+
 def event_callback(event_data: EventData):
     """处理接收到的事件数据"""
     # logger.info(f"Received event: {event_data}")
@@ -261,6 +465,23 @@ def event_callback(event_data: EventData):
             save_results.save_results(matched_results)
 
 
+def events_callback(events: List[EventData]):
+    """处理一条消息中的全部事件数据，统计和匹配各加锁一次"""
+    with map_lock:
+        for event_data in events:
+            region_name = event_data.region_name
+            if region_name is None:
+                continue
+            if region_name not in event_stats_map:
+                event_stats_map[region_name] = {'count': 0}
+            event_stats_map[region_name]['count'] += 1
+
+    if current_matcher is not None:
+        matched_results = current_matcher.add_events(events)
+        if len(matched_results) > 0:
+            save_results.save_results(matched_results)
+
+
 def points_callback(pointcloud_data: PointsData):
     """处理接收到的点云数据"""
     global points_queue
@@ -275,6 +496,7 @@ def connect():
     global current_trigger
     global current_matcher
     global current_pointcloud_adapter
+    global current_motion_gate
 
     try:
         data = request.get_json()
@@ -294,15 +516,21 @@ def connect():
             return jsonify({"success": False, "message": "请输入有效的RTSP URL"})
 
         # 初始化Tracker
-        current_tracker = Tracker(onnx_model_path='models/yolo11s.pt')
+        current_tracker = create_tracker(data, stream_id=rtsp_url)
 
         # 初始化Trigger
         if config_file is not None:
             current_trigger = Trigger(
                 lane_trigger_path=config_file, lane_detection_point="bottom_center")
 
+        if current_trigger is not None and data.get('trigger_mode'):
+            current_trigger.set_trigger_mode(data.get('trigger_mode'))
+
+        # 初始化运动门控
+        current_motion_gate = create_motion_gate(data)
+
         # 初始化Matcher
-        current_matcher = Matcher()
+        current_matcher = create_matcher(data)
 
         # 清空统计数据
         with map_lock:
@@ -318,6 +546,7 @@ def connect():
 
         current_data_adapter.set_image_callback(image_callback)
         current_data_adapter.set_event_callback(event_callback)
+        current_data_adapter.set_events_callback(events_callback)
         current_data_adapter.set_points_callback(points_callback)
         current_data_adapter.set_online_mode(
             rtsp_url=rtsp_url,
@@ -331,6 +560,74 @@ def connect():
         logger.error(f"connection error: {e}")
         return jsonify({"success": False, "message": str(e)})
 
+# 附加相机流：同一进程内多路相机共用一个推理服务，跨流组批
+
+
+@app.route('/api/streams/connect', methods=['POST'])
+def connect_stream():
+    """接入一路附加相机流，与主会话并发处理；同一 stream_id 重复接入时替换原来的流"""
+    try:
+        data = request.get_json()
+        rtsp_url = data.get('rtsp_url')
+        if not rtsp_url or not rtsp_url.startswith(('rtsp://', 'rtmp://', 'http://', 'https://')):
+            return jsonify({"success": False, "message": "请输入有效的RTSP URL"})
+        stream_id = data.get('stream_id') or rtsp_url
+        if isinstance(current_tracker, StreamTracker) and current_tracker.stream_id == stream_id:
+            return jsonify({"success": False, "message": "该相机流已由主会话处理"})
+
+        with camera_streams_lock:
+            previous = camera_streams.pop(stream_id, None)
+        if previous is not None:
+            previous.stop()
+
+        # 每路相机使用自己的车道/触发线配置，未指定时使用当前配置
+        trigger = Trigger(lane_trigger_path=data.get('config_path') or get_config_path(),
+                          lane_detection_point="bottom_center")
+        if data.get('trigger_mode'):
+            trigger.set_trigger_mode(data.get('trigger_mode'))
+        motion_gate = create_motion_gate(data)
+        if motion_gate is not None:
+            motion_gate.set_roi(trigger.get_lane_polygons())
+        tracker = get_inference_server(data).register_stream(
+            stream_id, detect_interval=int(data.get('detect_interval', 1)),
+            tracker_type=data.get('tracker', 'botsort'))
+
+        stream = CameraStream(stream_id, rtsp_url, tracker, trigger, motion_gate)
+        try:
+            stream.start()
+        except Exception:
+            tracker.server.unregister_stream(stream_id)
+            raise
+        with camera_streams_lock:
+            camera_streams[stream_id] = stream
+
+        logger.info(f"Connected camera stream {stream_id}: {rtsp_url}")
+        return jsonify({"success": True, "stream_id": stream_id})
+
+    except Exception as e:
+        logger.error(f"Camera stream connection error: {e}")
+        return jsonify({"success": False, "message": str(e)})
+
+
+@app.route('/api/streams/disconnect', methods=['POST'])
+def disconnect_stream():
+    """断开一路附加相机流"""
+    data = request.get_json()
+    with camera_streams_lock:
+        stream = camera_streams.pop(data.get('stream_id'), None)
+    if stream is None:
+        return jsonify({"success": False, "message": "相机流不存在"})
+    stream.stop()
+    return jsonify({"success": True})
+
+
+@app.route('/api/streams', methods=['GET'])
+def list_streams():
+    """列出附加相机流及其处理统计"""
+    with camera_streams_lock:
+        streams = [stream.get_stats() for stream in camera_streams.values()]
+    return jsonify({"success": True, "streams": streams})
+
 # Record文件相关路由
 
 
@@ -371,6 +668,7 @@ def play_record():
     global current_trigger
     global current_matcher
     global current_tracker
+    global current_motion_gate
 
     try:
         # 检查是否有文件上传
@@ -388,14 +686,20 @@ def play_record():
         logger.info(f"Loaded record file: {temp_file_path}")
 
         # 初始化Tracker
-        current_tracker = Tracker(onnx_model_path='models/yolo11s.pt')
+        current_tracker = create_tracker(request.form, stream_id=temp_file_path)
 
         # 初始化Trigger
         if config_file is not None:
             current_trigger = Trigger(lane_trigger_path=config_file)
 
+        if current_trigger is not None and request.form.get('trigger_mode'):
+            current_trigger.set_trigger_mode(request.form.get('trigger_mode'))
+
+        # 初始化运动门控
+        current_motion_gate = create_motion_gate(request.form)
+
         # 初始化Matcher
-        current_matcher = Matcher()
+        current_matcher = create_matcher(request.form)
 
         # 清空统计数据
         with map_lock:
@@ -410,6 +714,7 @@ def play_record():
 
         current_data_adapter.set_image_callback(image_callback)
         current_data_adapter.set_event_callback(event_callback)
+        current_data_adapter.set_events_callback(events_callback)
         current_data_adapter.set_points_callback(points_callback)
         current_data_adapter.set_offline_mode(temp_file_path, fps=10,
                                               camera_channel=request.form.get(
@@ -453,9 +758,19 @@ def save_config():
     """保存配置"""
     try:
         config = request.get_json()
+        path = get_config_path()
 
-        with open(config_file, 'w') as f:
+        # 先写临时文件再替换，避免热加载读到写了一半的配置
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
             json.dump(config, f, indent=2)
+        os.replace(tmp_path, path)
+
+        if current_trigger is not None:
+            # 等待编译完成，运动门控的ROI随新配置更新
+            current_trigger.reload(path, block=True)
+            if current_motion_gate is not None:
+                current_motion_gate.set_roi(current_trigger.get_lane_polygons())
 
         logger.info("Config saved successfully")
         return jsonify({"success": True, "message": "配置保存成功"})
@@ -470,18 +785,23 @@ def load_config():
     """加载配置"""
     global current_trigger
     try:
-        config_file = os.path.join(os.path.dirname(__file__), 'config.json')
-        if not os.path.exists(config_file):
+        path = get_config_path()
+        if not os.path.exists(path):
             return jsonify({"success": True, "config": {"lanes": [], "triggers": []}})
 
-        current_trigger = Trigger(
-            lane_trigger_path=config_file, lane_detection_point="bottom_center")
-
-        with map_lock:
-            image_stats_map.clear()
-            event_stats_map.clear()
-
-        with open(config_file, 'r') as f:
+        if current_trigger is None:
+            current_trigger = Trigger(
+                lane_trigger_path=path, lane_detection_point="bottom_center",
+                trigger_mode=request.args.get('trigger_mode', 'distance'))
+        else:
+            # 热加载：后台编译，下一帧替换，保留 track 状态和统计数据
+            current_trigger.reload(path, block=True)
+            if request.args.get('trigger_mode'):
+                current_trigger.set_trigger_mode(request.args.get('trigger_mode'))
+        if current_motion_gate is not None:
+            current_motion_gate.set_roi(current_trigger.get_lane_polygons())
+
+        with open(path, 'r') as f:
             config = json.load(f)
 
         logger.info("Config loaded successfully")
@@ -503,6 +823,7 @@ def cleanup():
         if current_data_adapter:
             current_data_adapter._clear_sources()
             current_data_adapter = None
+        stop_camera_streams()
 
         logger.info("Resources cleaned up successfully")
         return jsonify({"success": True, "message": "资源清理成功"})
@@ -554,6 +875,69 @@ def clear_stats():
     current_trigger = None
     return jsonify({"success": True, "message": "统计数据已清空"})
 
+# 导出结果
+
+
+@app.route('/api/results/export', methods=['POST'])
+def export_results():
+    """把结果CSV导出为Excel"""
+    try:
+        excel_file = save_results.save_to_excel()
+        if excel_file is None:
+            return jsonify({"success": False, "message": "没有可导出的结果"})
+        return jsonify({"success": True, "file": excel_file})
+    except Exception as e:
+        logger.error(f"Results export error: {e}")
+        return jsonify({"success": False, "message": str(e)})
+
+# 结果查询
+
+
+def parse_int_arg(name: str, default: Optional[int] = None) -> Optional[int]:
+    """读取整数查询参数，缺省或为空时返回默认值"""
+    value = request.args.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+@app.route('/api/results', methods=['GET'])
+def query_results():
+    """分页查询结果，支持区域、匹配状态和时间范围过滤，aggregate=1 时返回按区域的统计"""
+    try:
+        page = max(1, parse_int_arg('page', 1))
+        page_size = min(1000, max(1, parse_int_arg('page_size', 100)))
+        start_ms = parse_int_arg('start_ms')
+        end_ms = parse_int_arg('end_ms')
+        result = save_results.results_store.query(region_name=request.args.get('region') or None,
+                                                  status=request.args.get('status') or None,
+                                                  start_ms=start_ms, end_ms=end_ms,
+                                                  offset=(page - 1) * page_size, limit=page_size)
+        response = {"success": True, "page": page, "page_size": page_size,
+                    "total": result['total'], "results": result['rows']}
+        if is_enabled(request.args.get('aggregate', '')):
+            response['regions'] = save_results.results_store.aggregate(start_ms=start_ms, end_ms=end_ms)
+        return jsonify(response)
+    except Exception as e:
+        logger.error(f"Results query error: {e}")
+        return jsonify({"success": False, "message": str(e)})
+
+# 性能指标
+
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """获取推理链路的性能指标"""
+    metrics = {}
+    if current_motion_gate is not None:
+        metrics['motion_gate'] = current_motion_gate.get_stats()
+    if inference_server is not None:
+        metrics['inference_server'] = inference_server.get_stats()
+    with camera_streams_lock:
+        metrics['camera_streams'] = [stream.get_stats() for stream in camera_streams.values()]
+    if current_matcher is not None:
+        metrics['matcher'] = current_matcher.get_metrics()
+    metrics['save_results'] = save_results.get_stats()
+    return jsonify({"success": True, "metrics": metrics})
+
 # 健康检查
 
 